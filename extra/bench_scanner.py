@@ -0,0 +1,67 @@
+'''
+Benchmark the os.scandir image walker against the original Path.glob based getImages
+
+    python extra/bench_scanner.py                # builds a synthetic tree in a temp folder
+    python extra/bench_scanner.py /mnt/textures  # or walk an existing library (read only)
+'''
+from __future__ import print_function
+import os, sys, time, shutil, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "python"))
+from Houdini_Image_Browser import scanner
+
+try:
+    from pathlib import Path
+except ImportError:
+    from pathlib2 import Path
+
+
+def legacyGetImages(p, recurse=False):
+    # getImages as it was before the scandir walker, plus the is_dir check updateThumbList made per file
+    imExts = scanner.imExts
+    files = [a for a in (p.rglob("*") if recurse else p.glob("*")) if a.suffix[1:] in imExts]
+    return [a for a in files if not a.is_dir()]
+
+
+def makeTree(root, dirs=200, files=150):
+    exts = ["jpg", "EXR", "png", "tif", "txt", "json", "hdr", "JPG"]
+    for d in range(dirs):
+        sub = os.path.join(root, "lib%03d" % (d // 20), "set%03d" % d)
+        os.makedirs(sub)
+        for f in range(files):
+            open(os.path.join(sub, "tex%04d.%s" % (f, exts[f % len(exts)])), 'w').close()
+
+
+def timeit(label, fn, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        n = fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("%-40s %8d images %9.1f ms" % (label, n, best * 1000))
+
+
+def main():
+    tmp = None
+    if len(sys.argv) > 1:
+        root = sys.argv[1]
+    else:
+        tmp = root = tempfile.mkdtemp()
+        makeTree(root)
+    try:
+        one = sorted(os.path.join(root, d) for d in os.listdir(root))[0]
+        one = os.path.join(one, sorted(os.listdir(one))[0]) if os.path.isdir(one) else root
+        timeit("legacy getImages (one folder)", lambda: len(legacyGetImages(Path(one))))
+        timeit("scandir getImages (one folder)", lambda: len(scanner.getImages(one)))
+        timeit("legacy getImages (recursive)", lambda: len(legacyGetImages(Path(root), True)))
+        timeit("scandir getImages (recursive)", lambda: len(scanner.getImages(root, True)))
+        timeit("scandir entries (recursive)", lambda: sum(1 for e in scanner.iterImageEntries(root, True)))
+        timeit("scandir entries (recursive, 4 threads)", lambda: sum(1 for e in scanner.iterImageEntries(root, True, 4)))
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,12 @@ def load(libmagick):
         libmagick.GetGeometry.restype = c_int
     except AttributeError:
         libmagick.GetGeometry = None
+    try:
+        libmagick.GetImageHistogram.argtypes = [c_void_p, POINTER(c_size_t),
+                                                c_void_p]
+        libmagick.GetImageHistogram.restype = c_void_p
+    except AttributeError:
+        libmagick.GetImageHistogram = None
     libmagick.GetMagickCopyright.argtypes = []
     libmagick.GetMagickCopyright.restype = c_char_p
     try:
@@ -104,6 +110,8 @@ def load(libmagick):
     except AttributeError:
         libmagick.ParseGeometry = None
         libmagick.ParseMetaGeometry = None
+    libmagick.RelinquishMagickMemory.argtypes = [c_void_p]
+    libmagick.RelinquishMagickMemory.restype = c_void_p
     libmagick.SetMagickResourceLimit.argtypes = [c_int, c_ulonglong]
     libmagick.SetMagickResourceLimit.restype = c_int
 
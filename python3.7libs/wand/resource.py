@@ -4,10 +4,24 @@
 There is the global resource to manage in MagickWand API. This module
 implements automatic global resource management through reference counting.
 
+Threads
+-------
+
+The MagickWand environment is process wide.  :func:`genesis()` and
+:func:`terminus()` are serialized by :data:`environment_lock`, and the
+environment is not torn down while any thread holds a reference taken with
+:func:`increment_refcount()` or :func:`worker_context()`.
+
+A wand, i.e. any :class:`Resource` such as :class:`~wand.image.Image`, is
+owned by the thread using it.  Different threads may create and use their own
+wands at the same time, but a single wand must never be used by two threads
+at once; hand it over only after the first thread is done with it.
+
 """
 import atexit
 import contextlib
 import ctypes
+import threading
 import warnings
 
 from .api import library
@@ -15,66 +29,218 @@ from .compat import abc, string_type
 from .exceptions import TYPE_MAP, WandException
 from .version import MAGICK_VERSION_NUMBER
 
-__all__ = ('genesis', 'limits', 'shutdown', 'terminus',
-           'DestroyedResourceError', 'Resource', 'ResourceLimits')
+__all__ = ('allocation_stats', 'decrement_refcount', 'genesis',
+           'increment_refcount', 'limits', 'shutdown', 'terminus',
+           'worker_context', 'DestroyedResourceError', 'Resource',
+           'ResourceLimits')
+
+#: (:class:`threading.RLock`) Serializes :func:`genesis()`,
+#: :func:`terminus()` and the reference count of the MagickWand environment.
+#:
+#: .. versionadded:: Houdini_Image_Browser patch
+environment_lock = threading.RLock()
+
+_environment = {'instantiated': False, 'refcount': 0, 'thread_limit': None}
+
+#: Thread limits requested by the active :func:`worker_context()` calls.
+_thread_caps = []
 
 
 def genesis():
-    """Instantiates the MagickWand API.
+    """Instantiates the MagickWand API.  Only the first call after startup,
+    or after :func:`terminus()`, does any work, and concurrent first calls
+    are serialized.
 
     .. warning::
 
        Don't call this function directly. Use :func:`increment_refcount()` and
        :func:`decrement_refcount()` functions instead.
 
+    .. versionchanged:: Houdini_Image_Browser patch
+       Thread safe, and a no-op once the API is instantiated.
+
     """
-    library.MagickWandGenesis()
+    if _environment['instantiated']:
+        return
+    with environment_lock:
+        if not _environment['instantiated']:
+            library.MagickWandGenesis()
+            _environment['instantiated'] = True
 
 
 def terminus():
-    """Cleans up the MagickWand API.
+    """Cleans up the MagickWand API.  Nothing happens while references
+    taken with :func:`increment_refcount()` are held.
 
     .. warning::
 
        Don't call this function directly. Use :func:`increment_refcount()` and
        :func:`decrement_refcount()` functions instead.
 
+    .. versionchanged:: Houdini_Image_Browser patch
+       Serialized with :func:`genesis()`, and deferred while references
+       are held.
+
     """
-    if library.IsMagickWandInstantiated is None:  # pragma no cover
-        library.MagickWandTerminus()
-    elif library.IsMagickWandInstantiated():
-        library.MagickWandTerminus()
+    with environment_lock:
+        if _environment['refcount'] > 0:
+            return
+        if library.IsMagickWandInstantiated is None:  # pragma no cover
+            library.MagickWandTerminus()
+        elif library.IsMagickWandInstantiated():
+            library.MagickWandTerminus()
+        _environment['instantiated'] = False
+
+
+def increment_refcount():
+    """Takes a reference on the MagickWand environment, instantiating it if
+    needed.  :func:`terminus()` does nothing until every reference is
+    released with :func:`decrement_refcount()`.
+
+    .. versionadded:: Houdini_Image_Browser patch
+    """
+    with environment_lock:
+        _environment['refcount'] += 1
+        genesis()
+
+
+def decrement_refcount():
+    """Releases a reference taken with :func:`increment_refcount()`.
+    The environment itself stays up, it is cleaned up at exit by
+    :func:`shutdown()`, so workers coming and going don't pay for a new
+    :func:`genesis()` each time.
+
+    .. versionadded:: Houdini_Image_Browser patch
+    """
+    with environment_lock:
+        if _environment['refcount'] <= 0:
+            raise RuntimeError('decrement_refcount() without a matching '
+                               'increment_refcount()')
+        _environment['refcount'] -= 1
+
+
+@contextlib.contextmanager
+def worker_context(threads=None):
+    """Holds a reference on the MagickWand environment for a worker thread,
+    and optionally caps the OpenMP threads ImageMagick uses per operation.
+
+    .. code::
+
+        from wand.image import Image
+        from wand.resource import worker_context
 
+        def decode(filename):
+            with worker_context(threads=1):
+                with Image(filename=filename) as img:
+                    return img.make_blob('png')
 
+    The ``'thread'`` limit of :data:`limits` is process wide, so while
+    several contexts are active the smallest cap requested applies to all
+    of them.  The previous limit is restored when the last one exits.
+    With ``N`` workers, ``threads`` of about ``cores // N`` keeps decodes
+    from oversubscribing the cores.
+
+    :param threads: OpenMP threads per operation, or ``None`` to leave the
+                    limit alone.
+    :type threads: :class:`numbers.Integral`
+
+    .. versionadded:: Houdini_Image_Browser patch
+    """
+    increment_refcount()
+    try:
+        if threads:
+            with environment_lock:
+                if not _thread_caps:
+                    _environment['thread_limit'] = limits['thread']
+                _thread_caps.append(threads)
+                limits['thread'] = min(_thread_caps)
+        try:
+            yield
+        finally:
+            if threads:
+                with environment_lock:
+                    _thread_caps.remove(threads)
+                    if _thread_caps:
+                        limits['thread'] = min(_thread_caps)
+                    else:
+                        limits['thread'] = _environment['thread_limit']
+    finally:
+        decrement_refcount()
+
+
+#: (:class:`dict`) Live resource pointers mapped to their deallocators.
+#: Only touched while holding :data:`allocation_lock`.
 allocation_map = {}
 
+#: (:class:`threading.Lock`) Guards :data:`allocation_map` and the
+#: allocation counters, so resources can be created and destroyed from
+#: several threads at once.
+allocation_lock = threading.Lock()
+
+_allocation_counts = {'allocated': 0, 'deallocated': 0, 'peak': 0}
+
 
 def allocate_ref(addr, deallocator):
     global allocation_map
-    if len(allocation_map) == 0:
-        genesis()
+    genesis()
     if addr:
-        allocation_map[addr] = deallocator
+        with allocation_lock:
+            allocation_map[addr] = deallocator
+            _allocation_counts['allocated'] += 1
+            live = len(allocation_map)
+            if live > _allocation_counts['peak']:
+                _allocation_counts['peak'] = live
 
 
 def deallocate_ref(addr):
     global allocation_map
-    if addr in list(allocation_map):
+    with allocation_lock:
+        if addr not in allocation_map:
+            return
         deallocator = allocation_map.pop(addr)
-        if callable(deallocator):
-            deallocator(addr)
+        _allocation_counts['deallocated'] += 1
+    # Destroy outside of the lock, other threads keep allocating meanwhile.
+    if callable(deallocator):
+        deallocator(addr)
+
+
+def allocation_stats(reset_peak=False):
+    """Counts of the resources tracked by this module, for diagnostics.
+
+    .. code::
+
+        from wand.resource import allocation_stats
+
+        stats = allocation_stats()
+        print('{live} live, {peak} at most'.format(**stats))
+
+    :param reset_peak: restart the ``'peak'`` count from the current
+                       number of live resources after reading it.
+    :type reset_peak: :class:`bool`
+    :returns: a dictionary with the ``'live'`` resources, the ``'peak'``
+              number of live resources, and the running totals of
+              ``'allocated'`` and ``'deallocated'`` ones.
+    :rtype: :class:`dict`
+
+    .. versionadded:: Houdini_Image_Browser patch
+    """
+    with allocation_lock:
+        stats = dict(_allocation_counts, live=len(allocation_map))
+        if reset_peak:
+            _allocation_counts['peak'] = stats['live']
+    return stats
 
 
 @atexit.register
 def shutdown():
     global allocation_map
-    for addr in list(allocation_map):
-        try:
-            deallocator = allocation_map.pop(addr)
-            if callable(deallocator):
-                deallocator(addr)
-        except KeyError:
-            pass
+    with allocation_lock:
+        items = list(allocation_map.items())
+        allocation_map.clear()
+        _allocation_counts['deallocated'] += len(items)
+    for addr, deallocator in items:
+        if callable(deallocator):
+            deallocator(addr)
     terminus()
 
 
@@ -87,6 +253,9 @@ class Resource(object):
             # use the resource...
             pass
 
+    A resource belongs to the thread using it.  Threads can work on their
+    own resources concurrently, but must not share one at the same time.
+
     It doesn't implement constructor by itself, so subclasses should
     implement it. Every constructor should assign the pointer of its
     resource data into :attr:`resource` attribute inside of :keyword:`with`
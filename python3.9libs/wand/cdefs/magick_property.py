@@ -6,6 +6,7 @@
 from ctypes import (POINTER, c_void_p, c_char_p, c_size_t, c_ubyte, c_uint,
                     c_int, c_ulong, c_double, c_bool, c_ulonglong)
 from wand.cdefs.wandtypes import c_ssize_t
+from wand.cdefs.magick_image import MagickProgressMonitor
 
 __all__ = ('load',)
 
@@ -152,6 +153,10 @@ def load(lib, IM_VERSION):
     lib.MagickSetPassphrase.restype = c_bool
     lib.MagickSetPointsize.argtypes = [c_void_p, c_double]
     lib.MagickSetPointsize.restype = c_bool
+    lib.MagickSetProgressMonitor.argtypes = [
+        c_void_p, MagickProgressMonitor, c_void_p
+    ]
+    lib.MagickSetProgressMonitor.restype = c_void_p
     lib.MagickSetResolution.argtypes = [c_void_p, c_double, c_double]
     lib.MagickSetResolution.restype = c_bool
     lib.MagickSetResourceLimit.argtypes = [c_int, c_ulonglong]
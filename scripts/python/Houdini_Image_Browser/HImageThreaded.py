@@ -1,6 +1,5 @@
 from __future__ import print_function
-import sys, time, os, json, time, hashlib
-from collections import defaultdict
+import sys, time, os, json, time
 import functools
 
 try:
@@ -18,23 +17,31 @@ from PySide2.QtWidgets import *
 from PySide2.QtCore import *
 from PySide2 import QtUiTools
 
-# Wand
-from wand.image import Image
 import traceback
 
+from wand.resource import worker_context
+
+from .thumbindex import ThumbIndex, normPath, hasValidThumb
+from .scanner import walkImageDirs, findPending
+from .sequences import collapseSequences
+from .scheduler import ThumbScheduler
+from .thumbstore import openThumbStore
+from .imagecache import ImageCache
+from .search import TrigramIndex, LibraryIndex
+from . import thumbgen, tonemap
+from .procpool import ThumbProcessPool
+from .governor import ResourceGovernor
+from .viewer import TileViewer
+
 '''
 TODO
 
-JSON Dict lookup has been removed and thumb key-value (path-thumbpath) lookup is now done with a hash
-Recursive Thumb generation not tested yet with this. image size label not working yet?
+JSON Dict lookup has been removed. Thumbs are still named by path hash but cache membership and source metadata live in the sqlite thumb index
+Recursive Thumb generation not tested yet with this.
 
 QFileSystemModel / QTreeView can be slow on network drives due to large numbers of small files?
 
-search functionality in the list view?
-https://stackoverflow.com/questions/53772564/filter-search-a-qfilesystemmodel-in-a-qlistfiew-qsortfilterproxymodel-maybe
-
 Only multithread for larger numbers of images? >5?
-Check for thumb regeneration by date modified on the file?
 
 Profiling: python -m cProfile .\HImage.py
 '''
@@ -42,7 +49,6 @@ Profiling: python -m cProfile .\HImage.py
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 THUMBDIR = SCRIPT_DIR + "/thumbs" # default thumb location
 
-imExts = ["png", "jpg", "jpeg", "tga", "tiff", "exr", "hdr", "bmp", "tif", "gif", "dpx", "svg"]
 parmNames = ["file", "filename", "map", "path", "tex0", "ar_light_color_texture", "env_map", "TextureSampler1_tex0"]
 
 '''
@@ -50,48 +56,584 @@ Multithreading Thumbnail creation and insertion
 '''
 
 class WorkerSignals(QObject):
-    finished = Signal(object, int)
+    finished = Signal(object, int, int)
     error = Signal(tuple)
     result = Signal(object, int)
+    drained = Signal()  # the runner exited, whether or not it ran any job
+
+
+class ThumbRunner(QRunnable):
+    # Pulls jobs from the ThumbScheduler until it is empty, so queued work keeps its latest priority until it starts.
+    # Jobs are (path, token, generation), finished reports the generation of the job rather than of the runner,
+    # runners outlive the listing or recursive job which started them and go on with the next one's queue
+    # ompThreads caps ImageMagick's OpenMP threads while in-process decodes run, None when the jobs go to worker processes.
+    # With yieldTo the runner gives its thread up between jobs while that scheduler has work queued. QThreadPool
+    # priorities only order runnables which haven't started, they never preempt a running one.
+    # drained is emitted on every exit, also when the queue was cleared before the runner got its first job
+    def __init__(self, fn, scheduler, ompThreads=None, yieldTo=None):
+        super(ThumbRunner, self).__init__()
+        self.fn = fn
+        self.scheduler = scheduler
+        self.ompThreads = ompThreads
+        self.yieldTo = yieldTo
+        self.signals = WorkerSignals()
 
+    @Slot()
+    def run(self):
+        try:
+            with worker_context(self.ompThreads):
+                self.runJobs()
+        finally:
+            self.signals.drained.emit()
+
+    def runJobs(self):
+        while True:
+            if self.yieldTo is not None and len(self.yieldTo):
+                self.scheduler.release()
+                return
+            job = self.scheduler.pop()
+            if job is None:
+                return
+            idx, (path, token, generation) = job
+            result = None
+            try:
+                result = self.fn(path, token)
+            except thumbgen.Cancelled:
+                continue  # listing was replaced while this job ran
+            except:
+                traceback.print_exc()
+                exctype, value = sys.exc_info()[:2]
+                self.signals.error.emit((exctype, value, traceback.format_exc()))
+            else:
+                self.signals.result.emit(result, idx)
+            finally:
+                self.signals.finished.emit(result, idx, generation)
 
-class Worker(QRunnable):
-    def __init__(self, fn, idx, path, *args, **kwargs):
-        super(Worker, self).__init__()
-        # Store constructor arguments (re-used for processing)
-        self.fn = fn
-        self.idx = idx
+
+'''
+Background directory scanning
+'''
+
+def listItems(path, collapse=True):
+    # (DirEntry, Sequence or None) for every list item in a folder
+    for d, entries in walkImageDirs(path):
+        if collapse:
+            return collapseSequences(entries)
+        return [(entry, None) for entry in entries]
+    return []
+
+
+class PreviewSignals(QObject):
+    result = Signal(int, object, object)
+
+
+class PreviewWorker(QRunnable):
+    # Decodes the real source at screen resolution for the large preview, result is (generation, cache key, QImage)
+    def __init__(self, render, key, generation, token):
+        super(PreviewWorker, self).__init__()
+        self.render = render
+        self.key = key  # (path, ('source', w, h))
+        self.generation = generation
+        self.token = token
+        self.signals = PreviewSignals()
+
+    @Slot()
+    def run(self):
+        path, (kind, w, h) = self.key
+        try:
+            blob, width, height = self.render(path, (w, h), self.token)
+        except thumbgen.Cancelled:
+            return
+        except:
+            traceback.print_exc()
+            return
+        qim = QImage(blob, width, height, width * 4, QImage.Format_RGBA8888).copy()  # copy, the QImage doesn't own blob
+        self.signals.result.emit(self.generation, self.key, qim)
+
+
+class ScanSignals(QObject):
+    batch = Signal(int, object)
+    finished = Signal(int, int)
+
+
+class ScanWorker(QRunnable):
+    # Enumerates a directory and checks for cached thumbs off the GUI thread.
+    # Results are streamed back in batches of (path, has_thumb, sequence) tuples tagged with the listing generation
+    def __init__(self, path, generation, store, index=None, force=False, useFingerprint=False, collapse=True, batchSize=64, batchInterval=0.05):
+        super(ScanWorker, self).__init__()
         self.path = path
-        self.args = args
-        self.kwargs = kwargs
-        self.signals = WorkerSignals()
+        self.collapse = collapse  # one item per image sequence or UDIM set
+        self.store = store
+        self.index = index
+        self.force = force  # treat every thumb as stale
+        self.useFingerprint = useFingerprint  # content check before regenerating a file whose mtime changed
+        self.generation = generation
+        self.batchSize = batchSize
+        self.batchInterval = batchInterval  # seconds between batches, keeps the first thumbs quick
+        self.cancelled = False
+        self.signals = ScanSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def isCached(self, entry, rec):
+        if self.force:
+            return False
+        try:
+            st = entry.stat() if rec is not None else None  # untracked files don't need a stat
+            return hasValidThumb(entry.path, rec, self.store, self.index, self.useFingerprint, st)
+        except OSError:
+            return False
 
     @Slot()
     def run(self):
-        # Retrieve args/kwargs here; and fire processing using them
+        batch = []
+        count = 0
+        last = time.time()
         try:
-            result = self.fn(self.path)
+            records = self.index.lookupDir(self.path) if self.index else {}  # one query for the whole folder
+            for entry, seq in listItems(self.path, self.collapse):
+                if self.cancelled:
+                    return
+                batch.append((entry.path, self.isCached(entry, records.get(normPath(entry.path))), seq))
+                count += 1
+                if len(batch) >= self.batchSize or time.time() - last > self.batchInterval:
+                    self.signals.batch.emit(self.generation, batch)
+                    batch = []
+                    last = time.time()
+            if batch and not self.cancelled:
+                self.signals.batch.emit(self.generation, batch)
+        except:
+            traceback.print_exc()
+        finally:
+            if not self.cancelled:
+                self.signals.finished.emit(self.generation, count)
+
+
+class RecursiveScanSignals(QObject):
+    batch = Signal(int, object)
+    finished = Signal(int, int)
+
+
+class RecursiveScanWorker(QRunnable):
+    # Walks a folder tree streaming (path, size) batches of images without a current thumb.
+    # Cache hits are answered from the index one directory at a time and only counted
+    def __init__(self, path, generation, store, index=None, force=False, useFingerprint=False, threads=1, collapse=True, batchSize=256, batchInterval=0.25):
+        super(RecursiveScanWorker, self).__init__()
+        self.path = path
+        self.collapse = collapse
+        self.threads = threads  # folders listed in parallel
+        self.generation = generation
+        self.store = store
+        self.index = index
+        self.force = force
+        self.useFingerprint = useFingerprint
+        self.batchSize = batchSize
+        self.batchInterval = batchInterval
+        self.cancelled = False
+        self.counts = {'skipped': 0}  # read by the GUI for progress, only written here
+        self.signals = RecursiveScanSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    @Slot()
+    def run(self):
+        batch = []
+        last = time.time()
+        try:
+            for item in findPending([self.path], self.store, self.index, self.force, self.useFingerprint, self.counts, self.threads, self.collapse):
+                if self.cancelled:
+                    return
+                batch.append(item)
+                if len(batch) >= self.batchSize or time.time() - last > self.batchInterval:
+                    self.signals.batch.emit(self.generation, batch)
+                    batch = []
+                    last = time.time()
+            if batch and not self.cancelled:
+                self.signals.batch.emit(self.generation, batch)
+        except:
+            traceback.print_exc()
+        finally:
+            if not self.cancelled:
+                self.signals.finished.emit(self.generation, self.counts['skipped'])
+
+
+class WatchScanSignals(QObject):
+    finished = Signal(int, object, object, object, object)
+
+
+class WatchScanWorker(QRunnable):
+    # Re-lists a watched folder after a change notification and works out the rows to add, regenerate and remove
+    def __init__(self, path, generation, known, store, index=None, useFingerprint=False, collapse=True):
+        super(WatchScanWorker, self).__init__()
+        self.path = path
+        self.generation = generation
+        self.known = known  # path -> sequence for the items currently in the list
+        self.collapse = collapse
+        self.store = store
+        self.index = index
+        self.useFingerprint = useFingerprint
+        self.signals = WatchScanSignals()
+
+    @Slot()
+    def run(self):
+        added, changed, relabelled, listed = [], [], {}, set()
+        try:
+            records = self.index.lookupDir(self.path) if self.index else {}
+            items = listItems(self.path, self.collapse)
+            for entry, seq in items:
+                listed.add(entry.path)
+                rec = records.get(normPath(entry.path))
+                try:
+                    st = entry.stat() if rec is not None else None
+                    valid = hasValidThumb(entry.path, rec, self.store, self.index, self.useFingerprint, st)
+                except OSError:
+                    continue  # deleted while listing, the next notification removes it
+                if entry.path not in self.known:
+                    added.append((entry.path, valid, seq))
+                    continue
+                if not valid:
+                    changed.append(entry.path)
+                if seq != self.known[entry.path]:
+                    relabelled[entry.path] = seq  # frames or tiles were added or removed
+            # items which are gone, or whose file is now inside a sequence listed under another first file
+            removed = [p for p in self.known if p not in listed]
+            for p in removed:
+                if self.index and not os.path.exists(p):
+                    self.index.remove(p)
+        except:
+            traceback.print_exc()
+            added, changed, removed, relabelled = [], [], [], {}  # still report back, the panel waits for this scan to end
+        self.signals.finished.emit(self.generation, added, changed, removed, relabelled)
+
+
+class LibraryIndexSignals(QObject):
+    finished = Signal()
+
+
+class LibraryIndexWorker(QRunnable):
+    # Brings the library search index up to date with the thumb index
+    def __init__(self, library, thumbindex):
+        super(LibraryIndexWorker, self).__init__()
+        self.library = library
+        self.thumbindex = thumbindex
+        self.cancelled = False
+        self.signals = LibraryIndexSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    @Slot()
+    def run(self):
+        try:
+            self.library.update(self.thumbindex, cancelled=lambda: self.cancelled)
         except:
             traceback.print_exc()
-            exctype, value = sys.exc_info()[:2]
-            self.signals.error.emit((exctype, value, traceback.format_exc()))
-        else:
-            self.signals.result.emit(result, self.idx)
         finally:
-            self.signals.finished.emit(result, self.idx)
+            if not self.cancelled:
+                self.signals.finished.emit()
 
 
-def getImages(p, recurse=False):
-    all_files = []
-    if recurse:
-        for a in p.rglob("*"):
-            if a.suffix[1:] in imExts:
-                all_files.append(a)
-    else:
-        for a in p.glob("*"):
-            if a.suffix[1:] in imExts:
-                all_files.append(a)
-    return all_files
+class IconSignals(QObject):
+    result = Signal(int, str, object)
+
+
+class IconWorker(QRunnable):
+    # Reads and decodes cached thumbs for list rows off the GUI thread. Emits (generation, path, QImage) per path.
+    # Prefetch workers pass a ticket and give up once a newer prefetch replaced it, workers for painted rows pass none
+    def __init__(self, store, cache, paths, size, generation, ticket=None, current=None):
+        super(IconWorker, self).__init__()
+        self.store = store
+        self.cache = cache
+        self.paths = paths
+        self.size = size
+        self.generation = generation
+        self.ticket = ticket
+        self.current = current  # returns the latest ticket, None never gives up
+        self.signals = IconSignals()
+
+    @Slot()
+    def run(self):
+        for p in self.paths:
+            if self.current is not None and self.current() != self.ticket:
+                return
+            try:
+                qim = cachedThumb(self.cache, self.store, p, self.size)
+            except:
+                traceback.print_exc()
+                continue
+            self.signals.result.emit(self.generation, p, qim)
+
+
+'''
+Virtualized thumbnail list model
+'''
+
+class ThumbListModel(QAbstractListModel):
+    # Icons are only decoded for rows in (or near) the viewport and are dropped again once scrolled far away.
+    # Store reads and decodes all run on IconWorker, rows the view paints show the placeholder until theirs arrive
+    # and are queued ahead of the prefetch rows either side. Only thumbs already in the image cache are used directly
+    PathRole = Qt.UserRole + 1
+    TokenPathRole = Qt.UserRole + 2  # sequences as <UDIM> or $F paths, other items as PathRole
+
+    def __init__(self, store, cache, parent=None):
+        super(ThumbListModel, self).__init__(parent)
+        self.store = store
+        self.cache = cache
+        self.paths = []
+        self.names = []
+        self.rowOf = {}  # path -> row
+        self.seqs = {}  # path of the first file -> Sequence, only for collapsed items
+        self.pending = set()  # rows whose thumbs are still being generated
+        self.icons = {}  # row -> QIcon, only for rows near the viewport
+        self.iconSize = QSize(200, 200)
+        self.defaultIcon = QIcon()
+        self.visible = (0, -1)
+        self.generation = 0  # bumped by clear(), icons decoded for an older listing are dropped
+        self.prefetch = 0  # bumped by setVisibleRange(), older prefetch workers stop early
+        self.decodePool = QThreadPool(self)
+        self.decodePool.setMaxThreadCount(2)
+        self.decoding = set()  # paths of painted rows queued on the decode pool
+        self.requested = []  # painted rows waiting for the next flushRequests
+        self.flushTimer = QTimer(self)  # collects the rows of one paint into a single worker
+        self.flushTimer.setSingleShot(True)
+        self.flushTimer.setInterval(0)
+        self.flushTimer.timeout.connect(self.flushRequests)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.paths):
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.names[row]
+        elif role == Qt.ToolTipRole:
+            seq = self.seqs.get(self.paths[row])
+            return seq.tokenPath() if seq else self.names[row]
+        elif role == Qt.DecorationRole:
+            return self.icon(row)
+        elif role == Qt.SizeHintRole:
+            return QSize(self.iconSize.width(), self.iconSize.height() + 25)
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignHCenter | Qt.AlignBottom
+        elif role == ThumbListModel.PathRole:
+            return self.paths[row]
+        elif role == ThumbListModel.TokenPathRole:
+            seq = self.seqs.get(self.paths[row])
+            return seq.tokenPath() if seq else self.paths[row]
+        return None
+
+    def clear(self, iconSize, defaultIcon):
+        self.beginResetModel()
+        self.paths = []
+        self.names = []
+        self.rowOf = {}
+        self.seqs = {}
+        self.pending = set()
+        self.icons = {}
+        self.iconSize = iconSize
+        self.defaultIcon = defaultIcon
+        self.visible = (0, -1)
+        self.generation += 1
+        self.prefetch += 1
+        self.decodePool.clear()
+        self.decoding = set()
+        self.requested = []
+        self.endResetModel()
+
+    def appendImages(self, batch):
+        # batch of (path, has_thumb, sequence) tuples from the scanner. returns the new rows which need thumbs generating
+        if not batch:
+            return []
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        missing = []
+        for row, (p, cached, seq) in enumerate(batch, first):
+            self.paths.append(str(p))
+            self.names.append(seq.label() if seq else Path(p).name)
+            self.rowOf[str(p)] = row
+            if seq:
+                self.seqs[str(p)] = seq
+            if not cached:
+                self.pending.add(row)
+                missing.append(row)
+        self.endInsertRows()
+        return missing
+
+    def icon(self, row):
+        ic = self.icons.get(row)
+        if ic is not None:
+            return ic
+        if row in self.pending:
+            return self.defaultIcon
+        return self.loadIcon(row)
+
+    def loadIcon(self, row):
+        # icon straight from the image cache, otherwise the placeholder while the row waits for a decode worker
+        path = self.paths[row]
+        qim = self.cache.get((path, (self.iconSize.width(), self.iconSize.height())))
+        if qim is not None:
+            ic = QIcon(QPixmap.fromImage(qim))
+            self.icons[row] = ic
+            return ic
+        if path not in self.decoding:
+            self.decoding.add(path)
+            self.requested.append(path)
+            self.flushTimer.start()
+        return self.defaultIcon
+
+    def flushRequests(self):
+        if not self.requested:
+            return
+        size = (self.iconSize.width(), self.iconSize.height())
+        worker = IconWorker(self.store, self.cache, self.requested, size, self.generation)
+        worker.signals.result.connect(self.iconDecoded)
+        self.decodePool.start(worker, 1)  # ahead of the prefetch workers
+        self.requested = []
+
+    def thumbReady(self, path, row):
+        # look the row up again, rows shift when files are removed and the folder may have changed since
+        row = self.rowOf.get(path)
+        if row is None:
+            return
+        self.pending.discard(row)
+        self.icons.pop(row, None)
+        self.cache.invalidate(path)
+        first, last = self.visible
+        if first - self.window() <= row <= last + self.window():
+            idx = self.index(row)
+            self.dataChanged.emit(idx, idx, [Qt.DecorationRole])
+
+    def markStale(self, path):
+        # source changed on disk, show the placeholder until the new thumb lands. returns the row
+        row = self.rowOf.get(path)
+        if row is None:
+            return None
+        self.pending.add(row)
+        self.icons.pop(row, None)
+        self.cache.invalidate(path)
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx, [Qt.DecorationRole])
+        return row
+
+    def setSequence(self, path, seq):
+        row = self.rowOf.get(path)
+        if row is None:
+            return
+        if seq:
+            self.seqs[path] = seq
+        else:
+            self.seqs.pop(path, None)
+        self.names[row] = seq.label() if seq else Path(path).name
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx, [Qt.DisplayRole, Qt.ToolTipRole])
+
+    def removePaths(self, paths):
+        # returns the removed rows, highest first, in the order they were taken out
+        rows = sorted((self.rowOf[p] for p in paths if p in self.rowOf), reverse=True)
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.seqs.pop(self.paths[row], None)
+            del self.paths[row]
+            del self.names[row]
+            self.pending = set(r - 1 if r > row else r for r in self.pending if r != row)
+            self.icons = dict((r - 1 if r > row else r, ic) for r, ic in self.icons.items() if r != row)
+            self.endRemoveRows()
+        if rows:
+            self.rowOf = dict((p, i) for i, p in enumerate(self.paths))
+        return rows
+
+    def window(self):
+        # prefetch margin either side of the viewport, one page of rows
+        return max(20, self.visible[1] - self.visible[0] + 1)
+
+    def setVisibleRange(self, first, last):
+        self.visible = (first, last)
+        margin = self.window()
+        lo = max(0, first - margin)
+        hi = min(len(self.paths) - 1, last + margin)
+        # drop icons well outside the viewport so memory stays bounded regardless of folder size
+        keep = margin * 3
+        for row in [r for r in self.icons if r < first - keep or r > last + keep]:
+            del self.icons[row]
+        rows = [r for r in range(lo, hi + 1) if (r < first or r > last) and r not in self.icons and r not in self.pending
+                and self.paths[r] not in self.decoding]
+        self.prefetch += 1  # workers for an older range stop at their next path
+        if not rows:
+            return
+        rows.sort(key=lambda r: first - r if r < first else r - last)  # nearest to the viewport first
+        size = (self.iconSize.width(), self.iconSize.height())
+        worker = IconWorker(self.store, self.cache, [self.paths[r] for r in rows], size, self.generation, self.prefetch, lambda: self.prefetch)
+        worker.signals.result.connect(self.iconDecoded)
+        self.decodePool.start(worker)
+
+    def iconDecoded(self, generation, path, qim):
+        if generation != self.generation:
+            return
+        self.decoding.discard(path)
+        if qim.isNull():
+            return
+        row = self.rowOf.get(path)
+        if row is None or row in self.icons or row in self.pending:
+            return
+        first, last = self.visible
+        keep = self.window() * 3
+        if row < first - keep or row > last + keep:
+            return  # scrolled far away while it decoded
+        self.icons[row] = QIcon(QPixmap.fromImage(qim))
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx, [Qt.DecorationRole])
+
+
+class ThumbFilterProxy(QSortFilterProxyModel):
+    # Shows the source rows matched by the last name index search.
+    # Rows appended after that search (the scan is still streaming) are tested directly against the query
+    def __init__(self, parent=None):
+        super(ThumbFilterProxy, self).__init__(parent)
+        self.setDynamicSortFilter(False)  # thumb updates emit dataChanged constantly, they never change the match
+        self.query = ""
+        self.matches = None
+        self.searched = 0
+
+    def setMatches(self, query, rows):
+        self.query = query.lower()
+        self.matches = set(rows) if query else None
+        self.searched = self.sourceModel().rowCount()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, row, parent):
+        if self.matches is None:
+            return True
+        if row >= self.searched:
+            return self.query in self.sourceModel().names[row].lower()
+        return row in self.matches
+
+
+def loadThumb(store, p):
+    qim = QImage()
+    data = store.get(p)
+    if data:
+        qim.loadFromData(data, "JPG")
+    return qim
+
+
+def cachedThumb(cache, store, p, size):
+    # decoded thumb scaled to fit size, shared through the LRU by the list and the large preview
+    key = (str(p), tuple(size))
+    qim = cache.get(key)
+    if qim is None:
+        qim = loadThumb(store, p)
+        if qim.isNull():
+            return qim
+        if qim.width() > size[0] or qim.height() > size[1]:
+            qim = qim.scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        cache.put(key, qim)
+    return qim
 
 
 '''
@@ -112,11 +654,6 @@ class HImageThreaded(QWidget):
             m.setStandardButtons(QMessageBox.Ok)
             m.exec_()
 
-        # load thumbnail database
-        load = dict()
-        self.prevdb = defaultdict(dict, load)  # for comparisons when saving to disk?
-        self.thumbdb = defaultdict(dict, load)
-
         # load config
         with open(SCRIPT_DIR + "/config.json", 'r') as f:
             self.config = json.load(f)
@@ -137,6 +674,22 @@ class HImageThreaded(QWidget):
             except:
                 print("Custom Thumb Path not valid")
 
+        # load thumbnail database
+        try:
+            if not os.path.isdir(THUMBDIR):
+                os.makedirs(THUMBDIR)
+        except:
+            print("Thumb folder could not be created")
+        self.display = tonemap.displaySettings(self.config)  # HDR exposure and view transform
+        self.store = openThumbStore(THUMBDIR, self.config.get('ThumbBackend', 'files'))
+        self.imcache = ImageCache(int(self.config.get('ImageCacheMB', 256)) * 1024 * 1024, lambda qim: qim.sizeInBytes())
+        self.thumbindex = None
+        try:
+            self.thumbindex = ThumbIndex(THUMBDIR + "/thumbindex.db", self.config.get('ThumbIndexJournal', 'auto'))
+        except:
+            traceback.print_exc()
+            print("Thumb index could not be opened, falling back to thumb file checks")
+
         # load UI
         loader = QtUiTools.QUiLoader()
         self.ui = loader.load(scriptpath + '/himage.ui')
@@ -220,18 +773,38 @@ class HImageThreaded(QWidget):
         self.thumblargepreview.setAlignment(Qt.AlignHCenter | Qt.AlignVCenter)
 
         # Thumbnail list view
-        self.thumblist = self.ui.findChild(QListWidget, 'thumblist')
+        self.thumblist = self.ui.findChild(QListView, 'thumblist')
+        self.thumbmodel = ThumbListModel(self.store, self.imcache, self)
+        self.thumbproxy = ThumbFilterProxy(self)
+        self.thumbproxy.setSourceModel(self.thumbmodel)
+        self.thumblist.setModel(self.thumbproxy)
         self.thumblist.setIconSize(QSize(self.thSize[0], self.thSize[1]))
         self.thumblist.setSpacing(5)
+        self.thumblist.verticalScrollBar().valueChanged.connect(self.scheduleVisibleUpdate)
+        self.thumbmodel.rowsInserted.connect(self.scheduleVisibleUpdate)
+        self.visibleTimer = QTimer(self)  # coalesce scroll / insert events into one viewport update
+        self.visibleTimer.setSingleShot(True)
+        self.visibleTimer.setInterval(30)
+        self.visibleTimer.timeout.connect(self.updateVisibleRows)
         self.thumblist.doubleClicked.connect(self.setTexture)
         self.thumblist.clicked.connect(self.setLargePreview)
         self.thumblist.installEventFilter(self)
 
-        # Thumbnail list view filtering
+        # Thumbnail list view filtering, names are indexed as they are listed and searched after a short pause in typing
+        self.nameIndex = TrigramIndex()  # ids are rows of thumbmodel
+        self.library = LibraryIndex()  # every path in the thumb index, built on first use
+        self.libraryWorker = None
+        self.showingLibrary = False
+        self.searchpool = QThreadPool()
+        self.searchpool.setMaxThreadCount(1)
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(150)
+        self.searchTimer.timeout.connect(self.runSearch)
         self.filter_lineedit = self.ui.findChild(QLineEdit, 'imagefilter_lineedit')
         self.filter_lineedit.textChanged.connect(self.filterImages)
-
-        self.thumblistdict = {}  # Dict mapping full path to image basename
+        self.library_checkbox = self.ui.findChild(QCheckBox, 'librarysearch_checkbox')
+        self.library_checkbox.toggled.connect(self.filterImages)
 
         # remove margins and status bar
         self.centralWidget = self.ui.centralWidget()
@@ -246,6 +819,51 @@ class HImageThreaded(QWidget):
 
         # Multithreading
         self.threadpool = None
+        self.ompThreads = 1  # ImageMagick threads per in-process thumb worker, set with the thread pool
+        self.procpool = None  # optional out-of-process decoders, see ThumbProcessWorkers in config.json
+        # ImageMagick limits and the memory budget in-process decodes wait for, follows the free RAM unless DecodeBudgetMB is set
+        self.governor = ResourceGovernor(int(self.config.get('DecodeBudgetMB', 0)) * 1048576, int(self.config.get('DecodeDiskLimitMB', 0)) * 1048576)
+        self.scheduler = ThumbScheduler()  # pending list thumbs, visible rows first
+        self.listToken = thumbgen.CancelToken()
+        self.recScheduler = ThumbScheduler()  # recursive generation, runs behind the list thumbs
+        self.recToken = thumbgen.CancelToken()
+        self.recScanner = None
+        self.recGeneration = 0
+        self.walkpool = QThreadPool()  # long recursive walks shouldn't hold up folder scans
+        self.walkpool.setMaxThreadCount(1)
+        self.pbar = None  # progress of the running recursive job
+        self.pbarDone = None  # summary of the last finished one, kept until the next job replaces it
+        self.pbarTimer = QTimer(self)  # the label is refreshed on a timer rather than once per file
+        self.pbarTimer.setInterval(250)
+        self.pbarTimer.timeout.connect(self.updateProgressBar)
+        self.selectedPath = None
+        self.scanpool = QThreadPool()  # directory scans get their own pool so thumb jobs can't starve them
+        self.scanpool.setMaxThreadCount(1)
+        self.scanner = None
+        self.scanning = False
+
+        # large preview: the cached thumb is shown at once, a screen sized decode of the source replaces it when ready
+        self.previewpool = QThreadPool()
+        self.previewpool.setMaxThreadCount(1)  # superseded decodes abort, so one thread keeps up with clicking
+        self.previewToken = thumbgen.CancelToken()
+        self.previewGeneration = 0
+        self.previewKey = None
+        self.previewTimer = QTimer(self)  # skip decodes for items only passed over with the arrow keys
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.setInterval(100)
+        self.previewTimer.timeout.connect(self.startPreviewDecode)
+
+        # watch the displayed folder and patch only the rows which changed
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.folderChanged)
+        self.watchTimer = QTimer(self)  # debounce, renders and copies fire many notifications
+        self.watchTimer.setSingleShot(True)
+        self.watchTimer.setInterval(int(self.config.get('WatchDebounceMs', 500)))
+        self.watchTimer.timeout.connect(self.startWatchScan)
+        self.watchedPath = None
+        self.watchScan = None  # listing generation of the watch scan in flight
+        self.scanGeneration = 0
+        self.dirImageCount = 0
 
     def reset(self):
         self.treeSignal(self.tree.currentIndex())
@@ -257,24 +875,40 @@ class HImageThreaded(QWidget):
     # right click event for qlist widget ?
     # https://stackoverflow.com/questions/48890473/how-do-i-make-a-context-menu-for-each-item-in-a-qlistwidget
     def eventFilter(self, source, event):
+        if (event.type() == QEvent.Resize and source is self.thumblist):
+            self.scheduleVisibleUpdate()
+            return False
         if (event.type() == QEvent.ContextMenu and source is self.thumblist):
             menu = QMenu()
             menu.setStyleSheet(hou.qt.styleSheet())
             menu.addAction('Open in Explorer')
+            menu.addAction('Inspect Full Resolution')
             menu.addAction('Send to COPs (link to selected node)')
             menu.addAction('Convert to ACES sRGB Texture? TODO')
             action = menu.exec_(event.globalPos())
             if action:
                 # print("action made")
-                item = source.itemAt(event.pos())
+                item = source.indexAt(event.pos())
+                if not item.isValid():
+                    return True
                 if (action.text() == 'Open in Explorer'):
-                    self.openDirectory(self.dirLineEdit.text() + "/" + item.text())
+                    self.openDirectory(item.data(ThumbListModel.PathRole))
+                elif (action.text() == 'Inspect Full Resolution'):
+                    self.openViewer(item.data(ThumbListModel.PathRole))
                 elif (action.text() == 'Send to COPs (link to selected node)'):
                     self.sendToCOPs(item)
                 return True
         return False
         # return super(Dialog, self).eventFilter(source, event)
 
+    def openViewer(self, path):
+        # zoomable viewer on a tile pyramid cached next to the thumbs, the thumb stands in until the first level is built
+        budget = int(self.config.get('TileCacheMB', 128)) * 1048576
+        diskLimit = int(self.config.get('TileDiskMB', 4096)) * 1048576
+        viewer = TileViewer(path, THUMBDIR + "/tiles", budget, cachedThumb(self.imcache, self.store, path, self.thSize), self.display, self.governor,
+                            diskLimit, self)
+        viewer.show()
+
     def openDirectory(self, path):
         platform = sys.platform
         if platform == "win32":  # win
@@ -376,86 +1010,237 @@ class HImageThreaded(QWidget):
     '''
 
     def setSingleThumb(self, path, idx):
-        # thumbpath = self.thumbdb[str(path)]['thumb']
-        thumb_name_hashed = hashlib.md5(str(path).replace('\\', '/').encode('utf-8')).hexdigest()
-        try:
-            qim = QImage(THUMBDIR + "/" + thumb_name_hashed + ".jpg")
-            th = QPixmap.fromImage(qim).scaled(self.thListSize[0], self.thListSize[1], aspectMode=Qt.KeepAspectRatio)
-            item = self.updateDict[idx]
-            item.setIcon(QIcon(th))
-        except:
-            pass
-            # print("error setting thumbnail")
+        self.thumbmodel.thumbReady(path, idx)
+        if path is not None and path == self.selectedPath:
+            self.setLargePreview(path)  # the clicked item was waiting on this thumb
+
+    def dispatchThumbs(self):
+        self.startRunners(self.scheduler, 1, self.setSingleThumb, onDrained=self.listRunnerDrained)  # ahead of any recursive generation jobs
+
+    def listRunnerDrained(self):
+        if not len(self.scheduler) and len(self.recScheduler):
+            self.dispatchRecursive()  # recursive runners stepped aside for the list, bring them back
+
+    def dispatchRecursive(self):
+        # one thread is always left for the list thumbs, and the recursive runners give up theirs between jobs
+        # while list thumbs are queued, so browsing stays responsive during a long recursive job
+        pool = self.ensureThreadPool()
+        self.startRunners(self.recScheduler, 0, onFinished=self.recursiveThumbDone, maxRunners=max(1, pool.maxThreadCount() - 1),
+                          yieldTo=self.scheduler)
+
+    def startRunners(self, scheduler, priority, onResult=None, onFinished=None, maxRunners=None, yieldTo=None, onDrained=None):
+        # start runner threads for queued thumbs, up to maxRunners or the pool size
+        pool = self.ensureThreadPool()
+        if not self.procpool:
+            self.governor.refresh(pool.maxThreadCount(), self.ompThreads)
+        while scheduler.wantsRunner(maxRunners or pool.maxThreadCount()):
+            runner = ThumbRunner(self.generateThumbnail, scheduler, None if self.procpool else self.ompThreads, yieldTo)
+            if onResult:
+                runner.signals.result.connect(onResult)
+            if onFinished:
+                runner.signals.finished.connect(onFinished)
+            if onDrained:
+                runner.signals.drained.connect(onDrained)
+            pool.start(runner, priority)
+
+    def scheduleVisibleUpdate(self, *args):
+        self.visibleTimer.start()
+
+    def updateVisibleRows(self):
+        # find the first and last rows intersecting the viewport by probing the icon grid
+        view = self.thumblist
+        if not self.thumbmodel.rowCount():
+            return
+        rect = view.viewport().rect()
+        step = max(8, self.thListSize[0] // 4)
+        first = last = None
+        for y in range(rect.top(), rect.bottom(), step):
+            for x in range(rect.left(), rect.right(), step):
+                idx = view.indexAt(QPoint(x, y))
+                if idx.isValid():
+                    first = self.thumbproxy.mapToSource(idx).row()
+                    break
+            if first is not None:
+                break
+        for y in range(rect.bottom(), rect.top(), -step):
+            for x in range(rect.right(), rect.left(), -step):
+                idx = view.indexAt(QPoint(x, y))
+                if idx.isValid():
+                    last = self.thumbproxy.mapToSource(idx).row()
+                    break
+            if last is not None:
+                break
+        if first is None or last is None:
+            return
+        self.thumbmodel.setVisibleRange(first, last)
+        self.scheduler.reprioritize(first, last, self.thumbmodel.window())
+
+    def ensureThreadPool(self):
+        if not self.threadpool:
+            self.threadpool = QThreadPool()
+            self.threadpool.setExpiryTimeout(3000)
+            self.threadpool.setMaxThreadCount(max(1, self.threadpool.maxThreadCount() - 4))  # don't use all threads?
+            # print("Multithreading thumbnail generation with maximum %d threads" % self.threadpool.maxThreadCount())
+            # workers x ImageMagick threads should not exceed the cores, otherwise parallel decodes just thrash
+            self.ompThreads = int(self.config.get('ThumbOMPThreads', 0)) or max(1, (os.cpu_count() or 4) // self.threadpool.maxThreadCount())
+            workers = int(self.config.get('ThumbProcessWorkers', 0))
+            if workers > 0:
+                try:
+                    self.governor.refresh(workers, force=True)
+                    self.procpool = ThumbProcessPool(workers, int(self.config.get('ThumbProcessOMPThreads', 1)),
+                                                     float(self.config.get('ThumbProcessTimeout', 120)),
+                                                     self.config.get('ThumbProcessPython') or None, self.governor.budget)
+                    self.threadpool.setMaxThreadCount(workers)  # one thread per process, each just waits on its worker
+                except:
+                    traceback.print_exc()
+                    print("Thumb worker processes failed to start, generating in-process")
+        return self.threadpool
 
     def updateThumbList(self, path, force=False):
-        self.thumblist.clear()
-        self.thumblistdict.clear()
-        self.updateDict = defaultdict(QListWidget)  # update dict for threadpool
-        dirImages = getImages(Path(path))
-        self.dir_info.setText("Images in Folder: " + str(len(dirImages)))
+        self.resetListing()
+        self.showingLibrary = False
+        self.thumbproxy.setMatches(self.filter_lineedit.text(), [])
+
+        self.watchedPath = str(path)
+        if self.config.get('WatchFolder', True) and os.path.isdir(self.watchedPath):
+            self.watcher.addPath(self.watchedPath)
+
+        # directory enumeration and cache checks run on the scan pool and stream back into addThumbBatch
+        self.dir_info.setText("Images in Folder: scanning...")
+        self.scanning = True
+        self.scanner = ScanWorker(str(path), self.scanGeneration, self.store, self.thumbindex, force, self.config.get('ThumbFingerprint', False),
+                                  self.config.get('CollapseSequences', True))
+        self.scanner.signals.batch.connect(self.addThumbBatch)
+        self.scanner.signals.finished.connect(self.scanFinished)
+        self.scanpool.start(self.scanner)
+
+    def resetListing(self):
+        # cancel any scan still running for the previous listing and drop its queued thumb jobs
+        if self.scanner:
+            self.scanner.cancel()
+        self.scheduler.clear()
+        self.listToken.cancel()  # running jobs for the old listing abort at their next check
+        self.listToken = thumbgen.CancelToken()
+        self.selectedPath = None
+        self.scanGeneration += 1
+
+        self.dirImageCount = 0
+        self.nameIndex = TrigramIndex()
         self.thumblargepreview.clear()  # always clear this?
 
-        # get paths to generate thumbs for
-        imagelist = []
-        for p in dirImages:
-            if not p.is_dir() and p.suffix[1:] in imExts:
-                #filter for thumb creation here?
-                thumb_name_hashed = hashlib.md5(str(p).replace('\\', '/').encode('utf-8')).hexdigest()
-                thumbname = THUMBDIR + "/" + thumb_name_hashed + ".jpg"
-                if not Path(thumbname).exists():
-                    imagelist.append(p)
-
-        if imagelist:
-            if not self.threadpool:
-                self.threadpool = QThreadPool()
-                self.threadpool.setExpiryTimeout(3000)
-                self.threadpool.setMaxThreadCount(self.threadpool.maxThreadCount() - 4)  # don't use all threads?
-                # print("Multithreading thumbnail generation with maximum %d threads" % self.threadpool.maxThreadCount())
-            else:
-                self.threadpool.clear()
-
         #default icon
         qim = QImage(150, 150, QImage.Format_RGB16)
         qim.fill(QColor(0, 0, 0))
         th = QPixmap.fromImage(qim).scaled(self.thListSize[0], self.thListSize[1], aspectMode=Qt.KeepAspectRatio)
-        def_ic = QIcon(th)
-
-        for idx, im in enumerate(dirImages):
-            # For images which need thumbs to be generated
-            if im in imagelist:
-                imname = str(Path(im).name)
-                item = QListWidgetItem(def_ic, str(imname))
-                item.setToolTip(str(imname))
-                item.setSizeHint(QSize(self.thListSize[0], self.thListSize[1] + 25))
-                item.setTextAlignment(Qt.AlignHCenter | Qt.AlignBottom)
-                self.thumblist.addItem(item)
-                self.thumblistdict[imname] = str(im)
-                self.updateDict[idx] = item  # add the queued listitem to a widget so it can be updated properly
-
-                worker = Worker(self.generateThumbnail, idx, str(im))
-                worker.signals.result.connect(self.setSingleThumb)
-                self.threadpool.start(worker)
-            else:
-                thumb_name_hashed = hashlib.md5(str(im).replace('\\', '/').encode('utf-8')).hexdigest()
-                thumbname = THUMBDIR + "/" + thumb_name_hashed + ".jpg"
-                th = QPixmap(thumbname).scaled(self.thListSize[0], self.thListSize[1], aspectMode=Qt.KeepAspectRatio)
-                imname = str(Path(im).name)
-                item = QListWidgetItem(QIcon(th), str(imname))
-                item.setToolTip(str(imname))
-                item.setSizeHint(QSize(self.thListSize[0], self.thListSize[1] + 25))
-                item.setTextAlignment(Qt.AlignHCenter | Qt.AlignBottom)
-                self.thumblist.addItem(item)
-                self.thumblistdict[imname] = str(im)
-
-    def filterImages(self):
-        search_string = self.filter_lineedit.text()
-        for i in xrange(self.thumblist.count()):
-            item = self.thumblist.item(i)
-            text = item.text()
-            if (search_string in text.lower()):
-                item.setHidden(False)
-            else:
-                item.setHidden(True)
+        self.thumbmodel.clear(QSize(self.thListSize[0], self.thListSize[1]), QIcon(th))
+        self.thumblist.setIconSize(QSize(self.thListSize[0], self.thListSize[1]))
+
+        self.watchTimer.stop()
+        self.watchedPath = None
+        self.watchScan = None
+        self.scanning = False
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+
+    def addThumbBatch(self, generation, batch):
+        if generation != self.scanGeneration:
+            return  # results from a superseded scan
+        self.dirImageCount += len(batch)
+        # For images which need thumbs to be generated
+        for row in self.thumbmodel.appendImages(batch):
+            self.scheduler.add(row, (self.thumbmodel.paths[row], self.listToken, self.scanGeneration))
+        self.nameIndex.extend(self.thumbmodel.names[len(self.nameIndex):])  # the proxy filters the new rows itself
+        self.dispatchThumbs()
+        self.dir_info.setText("Images in Folder: " + str(self.dirImageCount) + " (scanning...)")
+
+    def scanFinished(self, generation, count):
+        if generation != self.scanGeneration:
+            return
+        self.scanning = False
+        self.dir_info.setText("Images in Folder: " + str(count))
+        st = self.imcache.stats()
+        self.dir_info.setToolTip("Image cache: %d hits / %d misses, %.1f of %.0f MB" % (st['hits'], st['misses'], st['bytes'] / 1048576.0, st['budget'] / 1048576.0))
+
+    def folderChanged(self, path):
+        self.watchTimer.start()
+
+    def startWatchScan(self):
+        if self.showingLibrary or not self.watchedPath:
+            return
+        if self.scanning or self.watchScan is not None:
+            self.watchTimer.start()  # let the initial listing or the last watch scan finish first
+            return
+        # one watch scan at a time, two started from the same snapshot would both add the new files
+        self.watchScan = self.scanGeneration
+        known = dict((p, self.thumbmodel.seqs.get(p)) for p in self.thumbmodel.paths)
+        worker = WatchScanWorker(self.watchedPath, self.scanGeneration, known, self.store, self.thumbindex,
+                                 self.config.get('ThumbFingerprint', False), self.config.get('CollapseSequences', True))
+        worker.signals.finished.connect(self.applyFolderChanges)
+        self.scanpool.start(worker)
+
+    def applyFolderChanges(self, generation, added, changed, removed, relabelled):
+        if generation == self.watchScan:
+            self.watchScan = None
+        if generation != self.scanGeneration:
+            return
+        for row in self.thumbmodel.removePaths(removed):
+            self.scheduler.removeKey(row)
+        for p, seq in relabelled.items():
+            self.thumbmodel.setSequence(p, seq)
+        for p in changed:
+            row = self.thumbmodel.markStale(p)
+            if row is not None and row not in self.scheduler:
+                self.scheduler.add(row, (p, self.listToken, self.scanGeneration))
+        if added:
+            self.addThumbBatch(generation, added)
+        elif changed:
+            self.dispatchThumbs()
+        if removed or relabelled:
+            self.nameIndex = TrigramIndex()  # rows shifted or names changed
+            self.nameIndex.extend(self.thumbmodel.names)
+            if self.filter_lineedit.text():
+                self.filterFolder()
+        self.dirImageCount = len(self.thumbmodel.paths)
+        self.dir_info.setText("Images in Folder: " + str(self.dirImageCount))
+
+    def filterImages(self, *args):
+        self.searchTimer.start()
+
+    def runSearch(self):
+        query = self.filter_lineedit.text()
+        if query and self.library_checkbox.isChecked():
+            self.showLibraryResults(query)
+        elif self.showingLibrary:
+            self.updateThumbList(Path(self.dirLineEdit.text()))  # back to the folder, filtered by the query
+        else:
+            self.filterFolder()
+
+    def filterFolder(self):
+        query = self.filter_lineedit.text()
+        self.thumbproxy.setMatches(query, self.nameIndex.search(query) if query else [])
+
+    def showLibraryResults(self, query):
+        if not self.thumbindex:
+            return
+        if self.libraryWorker is None:
+            # catch up with thumbs written since the last search, the results are refreshed when it is done
+            self.libraryWorker = LibraryIndexWorker(self.library, self.thumbindex)
+            self.libraryWorker.signals.finished.connect(self.libraryIndexed)
+            self.searchpool.start(self.libraryWorker)
+        limit = int(self.config.get('LibrarySearchLimit', 2000))
+        paths = self.library.search(query, limit)
+        self.resetListing()
+        self.showingLibrary = True
+        self.thumbproxy.setMatches("", [])
+        self.addThumbBatch(self.scanGeneration, [(p, True, None) for p in paths])
+        more = "+" if len(paths) >= limit else ""
+        indexing = " (indexing...)" if self.libraryWorker else ""
+        self.dir_info.setText("Library matches: %d%s of %d%s" % (len(paths), more, len(self.library), indexing))
+
+    def libraryIndexed(self):
+        self.libraryWorker = None
+        if self.showingLibrary and self.filter_lineedit.text() and self.library_checkbox.isChecked():
+            self.showLibraryResults(self.filter_lineedit.text())
 
     # return size to fill frame with aspect on
     def fitFrame(self, pixmap, x, y, w, h):
@@ -469,92 +1254,196 @@ class HImageThreaded(QWidget):
         return pixmap
 
     def setLargePreview(self, item):
-        texname = item.data()
-        texpath = self.thumblistdict[texname]
-        thumb_name_hashed = hashlib.md5(str(texpath).replace('\\', '/').encode('utf-8')).hexdigest()
+        texpath = item if isinstance(item, str) else item.data(ThumbListModel.PathRole)
+        self.selectedPath = texpath
+        row = self.thumbmodel.rowOf.get(texpath)
+        if row in self.thumbmodel.pending:
+            self.scheduler.promote(row)  # jump the queue, the preview is filled in by setSingleThumb
         try:
-            thumbname = THUMBDIR + "/" + thumb_name_hashed + ".jpg"
-            jpg = QPixmap(thumbname)
+            jpg = QPixmap.fromImage(cachedThumb(self.imcache, self.store, texpath, self.thSize))
             w = self.thumblargepreview.geometry().width()
             h = self.thumblargepreview.geometry().height()
             size = jpg.size()
             jpg = self.fitFrame(jpg, size.width(), size.height(), w, h)
             self.thumblargepreview.setPixmap(jpg)
-            # self.image_info.setText("Image Size: " + self.thumbdb[texpath]['res'].replace(" ", " x "))  # set image size info
-            self.image_info.setText("Image Size: N/A")  # set image size info
+            self.image_info.setText("Image Size: " + self.imageInfo(texpath))  # set image size info
         except:
             print("thumbnail not yet generated")
+        self.requestPreview(texpath)
+
+    def previewSize(self):
+        # label size rounded up, so small layout changes still hit the cache
+        cap = int(self.config.get('PreviewMaxSize', 2048))
+        w = self.thumblargepreview.width()
+        h = self.thumblargepreview.height()
+        return (min(cap, (w + 255) // 256 * 256), min(cap, (h + 255) // 256 * 256))
+
+    def requestPreview(self, texpath):
+        if not self.config.get('PreviewFromSource', True):
+            return
+        key = (texpath, ('source',) + self.previewSize())
+        if key == self.previewKey and not self.previewToken.cancelled:
+            return  # already decoding, e.g. the thumb finished while the preview was on its way
+        self.previewTimer.stop()
+        self.previewToken.cancel()  # a decode for the previous item aborts at its next progress callback
+        self.previewGeneration += 1
+        self.previewKey = None
+        rec = self.thumbindex.get(texpath) if self.thumbindex else None
+        if rec and rec['width'] and rec['width'] <= self.thSize[0] and rec['height'] <= self.thSize[1]:
+            return  # the thumb already is the full image
+        qim = self.imcache.get(key)
+        if qim is not None:
+            self.showPreview(qim)
+            return
+        self.previewKey = key
+        self.previewToken = thumbgen.CancelToken()
+        self.previewTimer.start()
+
+    def startPreviewDecode(self):
+        if self.previewKey is None:
+            return
+        if self.procpool:
+            render = functools.partial(self.procpool.preview, display=self.display)
+        else:
+            render = functools.partial(thumbgen.renderPreview, display=self.display, governor=self.governor)
+        worker = PreviewWorker(render, self.previewKey, self.previewGeneration, self.previewToken)
+        worker.signals.result.connect(self.previewReady)
+        self.previewpool.start(worker)
+
+    def previewReady(self, generation, key, qim):
+        self.imcache.put(key, qim)  # kept even if superseded, clicking back is then instant
+        if generation != self.previewGeneration or key[0] != self.selectedPath:
+            return
+        self.previewKey = None
+        self.showPreview(qim)
+
+    def showPreview(self, qim):
+        pixmap = QPixmap.fromImage(qim)
+        w = self.thumblargepreview.geometry().width()
+        h = self.thumblargepreview.geometry().height()
+        self.thumblargepreview.setPixmap(self.fitFrame(pixmap, qim.width(), qim.height(), w, h))
+
+    def imageInfo(self, texpath):
+        rec = self.thumbindex.get(texpath) if self.thumbindex else None
+        if not rec or not rec['width']:
+            return "N/A"
+        info = str(rec['width']) + " x " + str(rec['height'])
+        if rec['format']:
+            info += "  " + rec['format']
+        if rec['channels']:
+            info += "  " + str(rec['channels']) + "ch"
+        return info
 
     '''
     Thumbnail generation and db handling
     '''
 
-    def generateThumbnail(self, filepath):
-        with Image(filename=filepath) as img:
-            name_hash = hashlib.md5(filepath.replace('\\', '/').encode('utf-8')).hexdigest()
-            thumb_filename_hashed = THUMBDIR + "/" + name_hash + ".jpg"
-
-            # do not recreate the thumb if it exists. could do this earlier on?
-            # if not Path(thumb_filename_hashed).exists():
-            imsize = img.size
-            with img.convert('jpg') as i:
-                i.compression_quality = 68
-                i.transform(resize=str(self.thSize[0]) + 'x' + str(self.thSize[1]) + '>')  # faster than resize
-                # i.save(filename=thumbdir)
-                i.save(filename=thumb_filename_hashed)
-            key = filepath
-            return str(key)
+    def generateThumbnail(self, filepath, token=None):
+        useFingerprint = self.config.get('ThumbFingerprint', False)
+        if self.procpool:
+            return self.procpool.generate(filepath, self.store, self.thumbindex, self.thSize, useFingerprint=useFingerprint, token=token,
+                                          display=self.display)
+        return thumbgen.generateThumbnail(filepath, self.store, self.thumbindex, self.thSize, useFingerprint=useFingerprint, token=token,
+                                          display=self.display, governor=self.governor)
 
     def thumbGenNonRecursive(self):
         path = Path(self.dirLineEdit.text())
         self.updateThumbList(path, True)
 
     def thumbGenRecursive(self, force=False):
-        print("starting recursive")
-        path = Path(self.dirLineEdit.text())
-        imagelist = getImages(path, recurse=True)
-        print(len(imagelist))
-        imagelist = [p for p in imagelist]  # don't force re-create
-        print("retrieved image list")
-
-        if imagelist:
-            # progress bar
-            self.pbar = QProgressDialog("Generating Thumbnails", "Abort", 0, len(imagelist))
-            self.pbar.setWindowTitle("Thumbnail Generation Progress")
-            self.pbar.setMinimumSize(QSize(600, 0))
-            # self.pbar.setMaximum(0)
-            self.pbar.setValue(0)
-            self.pbar.setWindowModality(Qt.WindowModal)
-            # use a modeless window with a slot for cancelled?
-            # if (QThreadPool::globalInstance()->activeThreadCount())
-            # QThreadPool::globalInstance()->waitForDone();
-            # https://doc.qt.io/qtforpython/PySide2/QtWidgets/QProgressDialog.html
-
-            try:
-                self.pbar.setStyleSheet(hou.qt.styleSheet())
-            except:
-                print("hou not imported")
-            self.pbar.forceShow()
-
-            if not self.threadpool:
-                self.threadpool = QThreadPool()
-                self.threadpool.setExpiryTimeout(3000)
-                self.threadpool.setMaxThreadCount(self.threadpool.maxThreadCount() - 4)  # don't use all threads?
-            else:
-                self.threadpool.clear()
-
-            for idx, im in enumerate(imagelist):
-                imname = str(Path(im).name)
-                worker = Worker(self.generateThumbnail, idx, str(im))
-                worker.signals.finished.connect(self.updateProgressBar)
-                self.threadpool.start(worker)
-
-    def updateProgressBar(self, path, idx):
+        # streaming job: the walk feeds the queue as it goes, cached files are skipped via the index
+        self.abortRecursive()
+        path = self.dirLineEdit.text()
+        self.recGeneration += 1
+        self.recToken = thumbgen.CancelToken()
+        self.recStats = {'queued': 0, 'done': 0, 'failed': 0, 'bytes': 0, 'start': time.time(), 'walking': True}
+        self.recSizes = {}
+
+        # progress bar
+        if self.pbarDone:
+            self.pbarDone.close()
+            self.pbarDone.deleteLater()
+            self.pbarDone = None
+        self.pbar = QProgressDialog("Searching for images...", "Abort", 0, 0, self)
+        self.pbar.setWindowTitle("Thumbnail Generation Progress")
+        self.pbar.setMinimumSize(QSize(600, 0))
+        self.pbar.setValue(0)
+        self.pbar.setWindowModality(Qt.NonModal)
+        self.pbar.setAutoClose(False)
+        self.pbar.setAutoReset(False)
+        self.pbar.canceled.connect(self.abortRecursive)
         try:
-            self.pbar.setValue(self.pbar.value() + 1)
-            self.pbar.setLabelText(str(path))
+            self.pbar.setStyleSheet(hou.qt.styleSheet())
         except:
-            print("progress bar not found or thumb database write failed")
+            print("hou not imported")
+        self.pbar.forceShow()
+        self.pbarTimer.start()
+
+        self.recScanner = RecursiveScanWorker(path, self.recGeneration, self.store, self.thumbindex, force, self.config.get('ThumbFingerprint', False),
+                                              int(self.config.get('ScanThreads', 4)), self.config.get('CollapseSequences', True))
+        self.recScanner.signals.batch.connect(self.addRecursiveBatch)
+        self.recScanner.signals.finished.connect(self.recursiveScanFinished)
+        self.walkpool.start(self.recScanner)
+
+    def addRecursiveBatch(self, generation, batch):
+        if generation != self.recGeneration:
+            return
+        for path, size in batch:
+            self.recScheduler.add(self.recStats['queued'], (path, self.recToken, generation))
+            self.recSizes[path] = size
+            self.recStats['queued'] += 1
+        self.dispatchRecursive()
+
+    def recursiveScanFinished(self, generation, skipped):
+        if generation != self.recGeneration:
+            return
+        self.recStats['walking'] = False
+        self.updateProgressBar()
+
+    def recursiveThumbDone(self, path, idx, generation):
+        if generation != self.recGeneration:
+            return
+        if path is None:
+            self.recStats['failed'] += 1
+        else:
+            self.recStats['done'] += 1
+            self.recStats['bytes'] += self.recSizes.pop(path, 0)
+
+    def abortRecursive(self):
+        # drops queued work and cancels running decodes at their next check
+        if self.recScanner:
+            self.recScanner.cancel()
+            self.recScanner = None
+        self.recScheduler.clear()
+        self.recToken.cancel()
+        self.recGeneration += 1
+        if self.pbar:
+            self.pbarTimer.stop()
+            self.pbar.close()
+            self.pbar.deleteLater()
+            self.pbar = None
+
+    def updateProgressBar(self):
+        if not self.pbar:
+            return
+        st = self.recStats
+        finished = st['done'] + st['failed']
+        skipped = self.recScanner.counts['skipped'] if self.recScanner else 0
+        elapsed = max(time.time() - st['start'], 1e-6)
+        rate = st['done'] / elapsed
+        remaining = st['queued'] - finished
+        eta = "%d:%02d" % divmod(int(remaining / rate), 60) if rate > 0 else "--:--"
+        self.pbar.setMaximum(max(st['queued'], 1))
+        self.pbar.setValue(finished)
+        self.pbar.setLabelText("%s%d of %d generated, %d failed, %d already cached\n%.1f files/s   %.1f MB read   ETA %s" % (
+            "Searching... " if st['walking'] else "", finished, st['queued'], st['failed'], skipped, rate, st['bytes'] / 1048576.0, eta))
+        if not st['walking'] and finished >= st['queued']:
+            # all done, leave the summary up with a Close button
+            self.pbarTimer.stop()
+            self.pbar.canceled.disconnect(self.abortRecursive)
+            self.pbar.setCancelButtonText("Close")
+            self.pbarDone = self.pbar
+            self.pbar = None
 
     '''
     Interaction with Houdini nodes
@@ -582,14 +1471,15 @@ class HImageThreaded(QWidget):
                     break
 
     def setTexture(self, item):
-        texname = item.data()
-        texpath = self.thumblistdict[texname]
+        texpath = item.data(ThumbListModel.TokenPathRole)  # <UDIM> / $F paths for sequences
         QApplication.clipboard().setText(str(texpath).replace("\\", "/"))  # add to clipboard
         self._applyTex(texpath)
 
     def sendToCOPs(self, item):
-        texname = item.text()
-        texpath = self.thumblistdict[texname]
+        texpath = item.data(ThumbListModel.PathRole)
+        seq = self.thumbmodel.seqs.get(texpath)
+        if seq and not seq.udim:
+            texpath = seq.tokenPath()  # the file COP reads frame sequences, not UDIMs
         print(texpath)
         comp = hou.node('/img').createNode('img', "coptexture")
         comp.moveToGoodPosition()
@@ -607,11 +1497,33 @@ class HImageThreaded(QWidget):
     '''
 
     def closeEvent(self, event):
+        self.watchTimer.stop()
+        self.previewTimer.stop()
+        self.previewToken.cancel()
+        self.searchTimer.stop()
+        if self.libraryWorker:
+            self.libraryWorker.cancel()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if self.scanner:
+            self.scanner.cancel()
+        self.scheduler.clear()
+        self.listToken.cancel()
+        self.abortRecursive()
         try:
             self.threadpool.waitForDone()
             self.threadpool.clear()
         except:
             print("threadpool already deleted")
+        self.scanpool.waitForDone()
+        self.walkpool.waitForDone()
+        self.searchpool.waitForDone()
+        self.previewpool.waitForDone()
+        if self.procpool:
+            self.procpool.close()
+        if self.thumbindex:
+            self.thumbindex.close()
+        self.store.close()
         print("closing and clearing threadpool")
         event.accept()
 
@@ -0,0 +1,142 @@
+'''
+Headless batch thumbnailer
+
+Pre-warms a thumb cache without Houdini or PySide2, e.g. overnight on idle farm nodes:
+    PYTHONPATH=<root>/scripts/python:<root>/python3.9libs python -m Houdini_Image_Browser.batch --workers 8 /mnt/textures /mnt/hdri
+
+Uses the same store, index and generation code as the panel, so thumbs written here are picked up directly.
+Thumbs are keyed by source path. When the artists see the library under another path, map it with --map:
+    ... -m Houdini_Image_Browser.batch --map /mnt/textures=T:/textures /mnt/textures
+The mapped side must be written exactly as the panel shows it (drive letter case included).
+Safe to re-run: images with a current index record are skipped, so an interrupted run resumes where it stopped.
+'''
+from __future__ import print_function
+import sys, os, json, time, threading, argparse
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from pathlib import *
+except ImportError:
+    from pathlib2 import *
+
+from .scanner import findPending
+from .thumbindex import ThumbIndex, PathMap
+from .thumbstore import openThumbStore
+from .governor import ResourceGovernor
+from . import thumbgen, tonemap
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def loadConfig():
+    try:
+        with open(SCRIPT_DIR + "/config.json", 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def defaultThumbDir(config):
+    # same resolution as the panel: ThumbPath/thumbs if set, else the thumbs folder next to this script
+    if config.get('ThumbPath'):
+        return str(Path(config['ThumbPath']).joinpath("thumbs"))
+    return SCRIPT_DIR + "/thumbs"
+
+
+def main(argv=None):
+    config = loadConfig()
+    parser = argparse.ArgumentParser(description="Generate thumbnails for image folders without Houdini")
+    parser.add_argument("roots", nargs="+", help="folders to search recursively")
+    parser.add_argument("--thumbdir", default=defaultThumbDir(config), help="thumb cache folder (default from config.json)")
+    parser.add_argument("--backend", default=config.get('ThumbBackend', 'files'), choices=["files", "packed"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--walk-threads", type=int, default=int(config.get('ScanThreads', 4)), help="folders listed in parallel")
+    parser.add_argument("--processes", action="store_true", help="decode in worker processes instead of threads")
+    parser.add_argument("--omp-threads", type=int, default=1, help="ImageMagick threads per process worker")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per image before a process worker is restarted")
+    parser.add_argument("--force", action="store_true", help="regenerate thumbs which are already current")
+    parser.add_argument("--fingerprint", action="store_true", default=config.get('ThumbFingerprint', False),
+                        help="check content before regenerating files whose mtime changed")
+    parser.add_argument("--all-frames", action="store_true", help="thumbnail every file of a sequence or UDIM set, not just the first")
+    parser.add_argument("--map", action="append", default=[], metavar="SRC=DST",
+                        help="key thumbs under DST for sources found under SRC, e.g. /mnt/textures=T:/textures. repeatable")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+    try:
+        pathMap = PathMap(args.map)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not os.path.isdir(args.thumbdir):
+        os.makedirs(args.thumbdir)
+    store = openThumbStore(args.thumbdir, args.backend)
+    index = ThumbIndex(args.thumbdir + "/thumbindex.db", config.get('ThumbIndexJournal', 'auto'))
+    pool = None
+    governor = ResourceGovernor(int(config.get('DecodeBudgetMB', 0)) * 1048576, int(config.get('DecodeDiskLimitMB', 0)) * 1048576)
+    governor.refresh(args.workers, force=True)
+    if args.processes:
+        from .procpool import ThumbProcessPool
+        pool = ThumbProcessPool(args.workers, args.omp_threads, args.timeout, memoryLimit=governor.budget)
+
+    display = tonemap.displaySettings(config)
+    counts = {'done': 0, 'failed': 0, 'skipped': 0, 'bytes': 0}
+    lock = threading.Lock()
+    tasks = queue.Queue(maxsize=args.workers * 4)  # bounded so generation starts while the walk continues
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            im, size = task
+            try:
+                if pool:
+                    pool.generate(im, store, index, useFingerprint=args.fingerprint, display=display, key=pathMap(im))
+                else:
+                    thumbgen.generateThumbnail(im, store, index, useFingerprint=args.fingerprint, display=display, governor=governor,
+                                               key=pathMap(im))
+                with lock:
+                    counts['done'] += 1
+                    counts['bytes'] += size
+            except Exception as e:
+                with lock:
+                    counts['failed'] += 1
+                print("FAILED %s: %s" % (im, e), file=sys.stderr)
+
+    threads = [threading.Thread(target=work) for i in range(args.workers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    start = last = time.time()
+    try:
+        for task in findPending(args.roots, store, index, args.force, args.fingerprint, counts, args.walk_threads,
+                                collapse=config.get('CollapseSequences', True) and not args.all_frames, mapPath=pathMap):
+            tasks.put(task)
+            if not args.quiet and time.time() - last > 5:
+                last = time.time()
+                print("%(done)d generated, %(failed)d failed, %(skipped)d up to date" % counts, file=sys.stderr)
+        for t in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        print("interrupted, re-run to resume", file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+        index.close()
+        store.close()
+
+    elapsed = time.time() - start
+    print("%d generated, %d failed, %d up to date in %.1fs (%.1f images/s, %.1f MB read)" % (
+        counts['done'], counts['failed'], counts['skipped'], elapsed, counts['done'] / max(elapsed, 1e-6), counts['bytes'] / 1048576.0), file=sys.stderr)
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+'''
+ImageMagick resource limits and decode admission (no Qt or hou imports)
+
+Left alone, ImageMagick lets every decode grow its pixel cache in RAM up to its own defaults, so a dozen workers
+each opening a 16K EXR push the machine into swap. ResourceGovernor picks a decode budget (DecodeBudgetMB, or
+MEMORY_FRACTION of the RAM available when 0) which all workers share:
+ - memory / map / area limits so ImageMagick spills to its disk cache before the system starts swapping
+ - thread limit so workers x OpenMP threads stays within the cores
+ - admit() blocks a decode until its estimated pixel memory, from the header read by Image.ping, fits next to
+   the decodes already running. An image bigger than the whole budget waits until it can run alone.
+   Decodes are admitted in arrival order, so a stream of small files can't starve a huge one.
+   Long running holders such as a tile pyramid build shrink() their admission once the working copies are freed.
+The budget follows the available RAM, refresh() re-reads it at most every REFRESH_SECONDS.
+ImageMagick silently ignores limits above the ones in its policy.xml.
+'''
+import os, sys, ctypes, time, threading, contextlib, traceback
+from collections import deque
+
+from wand.resource import limits
+from wand.version import QUANTUM_DEPTH, MAGICK_HDRI
+
+MEMORY_FRACTION = 0.5
+WORKING_COPIES = 2  # source plus the converted / resized copy the thumbnail pipeline holds at once
+REFRESH_SECONDS = 5.0
+MB = 1048576
+
+
+class _MemoryStatus(ctypes.Structure):
+    _fields_ = [("dwLength", ctypes.c_uint32), ("dwMemoryLoad", ctypes.c_uint32),
+                ("ullTotalPhys", ctypes.c_uint64), ("ullAvailPhys", ctypes.c_uint64),
+                ("ullTotalPageFile", ctypes.c_uint64), ("ullAvailPageFile", ctypes.c_uint64),
+                ("ullTotalVirtual", ctypes.c_uint64), ("ullAvailVirtual", ctypes.c_uint64),
+                ("ullAvailExtendedVirtual", ctypes.c_uint64)]
+
+
+def memoryInfo():
+    # (total, available) physical memory in bytes, either can be None when the platform doesn't tell
+    try:
+        if sys.platform == "win32":
+            status = _MemoryStatus()
+            status.dwLength = ctypes.sizeof(status)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullTotalPhys, status.ullAvailPhys
+        elif os.path.exists("/proc/meminfo"):
+            fields = {}
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    name, value = line.split(":", 1)
+                    fields[name] = int(value.split()[0]) * 1024
+            return fields.get("MemTotal"), fields.get("MemAvailable", fields.get("MemFree"))
+        else:
+            return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"), None
+    except (AttributeError, OSError, ValueError):
+        pass
+    return None, None
+
+
+def pixelBytes(width, height, channels):
+    # pixel cache bytes of one decoded width x height image, HDRI builds store float quanta
+    quantum = 4 if MAGICK_HDRI else max(1, QUANTUM_DEPTH // 8)
+    return width * height * max(1, channels) * quantum
+
+
+class ResourceGovernor(object):
+    def __init__(self, budget=0, diskLimit=0):
+        self.fixedBudget = budget  # bytes, 0 follows the available RAM
+        self.diskLimit = diskLimit  # bytes, 0 leaves ImageMagick's default
+        self.cond = threading.Condition()
+        self.budget = budget or 1024 * MB
+        self.workers = 1
+        self.threads = None
+        self.inflight = 0  # estimated bytes of the admitted decodes
+        self.running = 0
+        self.queue = deque()  # waiting admissions, first in line is the only one that may start
+        self.lastRefresh = None
+
+    def refresh(self, workers=None, threads=None, force=False):
+        # recompute the budget and push the limits to ImageMagick, cheap enough to call on every dispatch.
+        # threads is the OpenMP limit per decode, by default the cores divided between the workers
+        now = time.time()
+        if workers:
+            force = force or workers != self.workers
+            self.workers = workers
+        if threads:
+            self.threads = threads
+        if not force and self.lastRefresh is not None and now - self.lastRefresh < REFRESH_SECONDS:
+            return
+        self.lastRefresh = now
+        budget = self.fixedBudget
+        if not budget:
+            total, available = memoryInfo()
+            free = available if available is not None else (total or 2048 * MB) // 2
+            budget = max(256 * MB, int((free + self.inflight) * MEMORY_FRACTION))  # memory our own decodes hold counts as free
+        with self.cond:
+            self.budget = budget
+            self.cond.notify_all()  # a bigger budget may let waiting decodes in
+        self.applyLimits()
+
+    def applyLimits(self):
+        try:
+            limits['memory'] = self.budget
+            limits['map'] = self.budget * 2
+            limits['area'] = self.budget // pixelBytes(1, 1, 4)  # pixels of one image before it goes to the disk cache
+            limits['thread'] = self.threads or max(1, (os.cpu_count() or 4) // self.workers)
+            if self.diskLimit:
+                limits['disk'] = self.diskLimit
+        except:
+            traceback.print_exc()
+            print("Could not set ImageMagick resource limits")
+
+    def estimate(self, width, height, channels):
+        return pixelBytes(width, height, channels) * WORKING_COPIES
+
+    @contextlib.contextmanager
+    def admit(self, nbytes, token=None):
+        # holds nbytes of the budget while a decode runs
+        need = self.acquire(nbytes, token)
+        try:
+            yield
+        finally:
+            self.release(need)
+
+    def acquire(self, nbytes, token=None):
+        need = min(nbytes, self.budget)
+        ticket = object()
+        with self.cond:
+            self.queue.append(ticket)
+            try:
+                while self.queue[0] is not ticket or (self.running and self.inflight + need > self.budget):
+                    self.cond.wait(0.25)
+                    if token:
+                        token.check()  # a cancelled listing gives up its place in the queue
+            except:
+                self.queue.remove(ticket)
+                self.cond.notify_all()
+                raise
+            self.queue.popleft()
+            self.inflight += need
+            self.running += 1
+            self.cond.notify_all()  # the next in line may fit as well
+        return need
+
+    def shrink(self, need, nbytes):
+        # lowers a running admission to nbytes, returns what release() has to give back now
+        smaller = min(need, nbytes)
+        with self.cond:
+            self.inflight -= need - smaller
+            self.cond.notify_all()
+        return smaller
+
+    def release(self, need):
+        with self.cond:
+            self.inflight -= need
+            self.running -= 1
+            self.cond.notify_all()
@@ -0,0 +1,60 @@
+'''
+In-memory LRU cache of decoded images with a byte budget
+
+Keys are (source path, target size) so the thumb list and large preview can share entries.
+Values only need to be measurable by the sizeof callable (QImage.sizeInBytes in the panel).
+'''
+import threading
+from collections import OrderedDict
+
+
+class ImageCache(object):
+    def __init__(self, budget, sizeof):
+        self.budget = budget  # bytes
+        self.sizeof = sizeof
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, nbytes), least recently used first
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        nbytes = self.sizeof(value)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            if nbytes > self.budget:
+                return  # never cache something which would evict everything else
+            self.entries[key] = (value, nbytes)
+            self.used += nbytes
+            while self.used > self.budget:
+                k, (v, n) = self.entries.popitem(last=False)
+                self.used -= n
+
+    def invalidate(self, path):
+        # drop every size cached for a source, used when its thumb is regenerated
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == path]:
+                self.used -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.used,
+                    "budget": self.budget, "hitrate": self.hits / float(total) if total else 0.0}
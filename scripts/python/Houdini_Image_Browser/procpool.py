@@ -0,0 +1,268 @@
+'''
+Out-of-process thumbnail generation
+
+A pool of headless python processes which decode thumbnails with thumbgen.renderThumbnail.
+Keeps ImageMagick crashes out of the Houdini session and lets decodes run outside the GIL.
+Tasks go to a worker as one JSON line on stdin, the reply is a JSON header line on stdout followed by the JPEG bytes.
+Workers which crash or exceed the task timeout are restarted.
+
+Standalone test without Houdini:
+    python -m Houdini_Image_Browser.procpool --workers 4 --thumbdir /tmp/thumbs image.exr ...
+'''
+from __future__ import print_function
+import sys, os, json, subprocess, threading, traceback, argparse, time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class WorkerTimeout(WorkerCrashed):
+    pass
+
+
+def defaultPython():
+    # inside Houdini sys.executable is the houdini binary, so prefer hython
+    hfs = os.environ.get('HFS')
+    if hfs:
+        for name in ("hython.exe", "hython"):
+            p = os.path.join(hfs, "bin", name)
+            if os.path.exists(p):
+                return p
+    return sys.executable
+
+
+def _readExactly(f, n):
+    chunks = []
+    while n > 0:
+        chunk = f.read(n)
+        if not chunk:
+            raise WorkerCrashed("worker closed its pipe mid reply")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+class _Process(object):
+    def __init__(self, cmd, env):
+        self.cmd = cmd
+        self.env = env
+        self.proc = None
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(self.cmd, env=self.env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0,
+                                     creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def call(self, request, timeout=None):
+        timedOut = []
+
+        def expire():
+            timedOut.append(True)
+            self.kill()  # unblocks the pending read below
+
+        timer = threading.Timer(timeout, expire) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            self.proc.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+            if not line:
+                raise WorkerCrashed("worker exited with code %s" % self.proc.wait())
+            header = json.loads(line.decode('utf-8'))
+            blob = _readExactly(self.proc.stdout, header.get('length', 0))
+        except (IOError, OSError, ValueError) as e:
+            raise WorkerCrashed(str(e))
+        except WorkerCrashed:
+            if timedOut:
+                raise WorkerTimeout("%s timed out after %ss" % (request.get('path'), timeout))
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+        return header, blob
+
+    def close(self):
+        try:
+            self.proc.stdin.close()  # worker loop exits on EOF
+            self.proc.wait()
+        except (IOError, OSError):
+            self.kill()
+
+
+class ThumbProcessPool(object):
+    def __init__(self, workers=2, ompThreads=1, timeout=120, python=None, memoryLimit=0):
+        self.timeout = timeout
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)  # wand and this package resolve as in the parent
+        env['MAGICK_THREAD_LIMIT'] = str(ompThreads)  # workers x ImageMagick threads should not exceed the cores
+        env['OMP_NUM_THREADS'] = str(ompThreads)
+        if memoryLimit:
+            env['MAGICK_MEMORY_LIMIT'] = str(memoryLimit // workers)  # bytes, the workers share the decode budget
+            env['MAGICK_MAP_LIMIT'] = str(memoryLimit * 2 // workers)
+        cmd = [python or defaultPython(), "-m", "Houdini_Image_Browser.procpool", "--worker"]
+        self.processes = [_Process(cmd, env) for i in range(workers)]
+        self.idle = queue.Queue()
+        for p in self.processes:
+            self.idle.put(p)
+
+    def render(self, filepath, size, quality, display=None):
+        # blocks until a worker is free, returns (jpeg bytes, source info)
+        proc = self.idle.get()
+        try:
+            if not proc.alive():
+                proc.restart()
+            header, blob = proc.call({"path": str(filepath), "size": list(size), "quality": quality, "display": display}, self.timeout)
+        except WorkerCrashed:
+            proc.restart()
+            raise
+        finally:
+            self.idle.put(proc)
+        if not header.get('ok'):
+            raise RuntimeError(header.get('error', "thumbnail generation failed"))
+        return blob, header['info']
+
+    def preview(self, filepath, size, token=None, display=None):
+        # same contract as thumbgen.renderPreview
+        if token:
+            token.check()
+        proc = self.idle.get()
+        try:
+            if not proc.alive():
+                proc.restart()
+            header, blob = proc.call({"kind": "preview", "path": str(filepath), "size": list(size), "display": display}, self.timeout)
+        except WorkerCrashed:
+            proc.restart()
+            raise
+        finally:
+            self.idle.put(proc)
+        if not header.get('ok'):
+            raise RuntimeError(header.get('error', "preview failed"))
+        if token:
+            token.check()
+        return blob, header['info']['width'], header['info']['height']
+
+    def generate(self, filepath, store, index=None, size=None, quality=None, useFingerprint=False, token=None, display=None, key=None):
+        # same contract as thumbgen.generateThumbnail, but the decode runs in a worker process.
+        # a running decode isn't interrupted, the token is checked before sending and before storing
+        from . import thumbgen
+        if token:
+            token.check()
+        st = os.stat(filepath)
+        blob, info = self.render(filepath, size or thumbgen.THUMB_SIZE, quality or thumbgen.THUMB_QUALITY, display)
+        if token:
+            token.check()
+        thumbgen.storeThumbnail(filepath, st, blob, info, store, index, useFingerprint, key)
+        return str(filepath)
+
+    def close(self):
+        for p in self.processes:
+            p.close()
+
+
+def workerMain():
+    # protocol replies go to the real stdout, anything the decoders print ends up on stderr
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+
+    from wand.resource import limits
+    threads = os.environ.get('MAGICK_THREAD_LIMIT')
+    if threads:
+        limits['thread'] = int(threads)
+    from . import thumbgen
+
+    for line in iter(stdin.readline, b''):
+        request = json.loads(line.decode('utf-8'))
+        blob = b""
+        try:
+            if request.get('kind') == 'preview':
+                blob, width, height = thumbgen.renderPreview(request['path'], tuple(request['size']), display=request.get('display'))
+                info = {"width": width, "height": height}
+            else:
+                blob, info = thumbgen.renderThumbnail(request['path'], tuple(request['size']), request['quality'], display=request.get('display'))
+            header = {"ok": True, "info": info, "length": len(blob)}
+        except Exception:
+            header = {"ok": False, "error": traceback.format_exc(), "length": 0}
+            blob = b""
+        out.write((json.dumps(header) + "\n").encode('utf-8'))
+        out.write(blob)
+        out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate thumbnails through a pool of worker processes")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--omp-threads", type=int, default=1, help="ImageMagick threads per worker")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per image before the worker is restarted")
+    parser.add_argument("--thumbdir", help="thumb cache folder")
+    parser.add_argument("--backend", default="files", choices=["files", "packed"])
+    parser.add_argument("images", nargs="*")
+    args = parser.parse_args(argv)
+    if args.worker:
+        return workerMain()
+    if not args.thumbdir:
+        parser.error("--thumbdir is required")
+
+    from .thumbstore import openThumbStore
+    from .thumbindex import ThumbIndex
+    if not os.path.isdir(args.thumbdir):
+        os.makedirs(args.thumbdir)
+    store = openThumbStore(args.thumbdir, args.backend)
+    index = ThumbIndex(args.thumbdir + "/thumbindex.db")
+    pool = ThumbProcessPool(args.workers, args.omp_threads, args.timeout)
+    tasks = queue.Queue()
+    for im in args.images:
+        tasks.put(im)
+    failed = []
+
+    def run():
+        while True:
+            try:
+                im = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                pool.generate(im, store, index)
+                print(im)
+            except Exception as e:
+                failed.append(im)
+                print("FAILED %s: %s" % (im, e), file=sys.stderr)
+
+    start = time.time()
+    threads = [threading.Thread(target=run) for i in range(args.workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pool.close()
+    index.close()
+    store.close()
+    print("%d images in %.1fs, %d failed" % (len(args.images), time.time() - start, len(failed)), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
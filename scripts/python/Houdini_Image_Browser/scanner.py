@@ -0,0 +1,152 @@
+'''
+Image discovery on disk (no Qt or hou imports)
+
+Built on os.scandir: extensions are matched on the entry name before anything else is touched,
+no Path objects are made for non-images, and DirEntry caches its type (and on Windows its stat) from the listing.
+Recursive walks can list subdirectories on several threads, which mostly helps on network drives.
+'''
+import os, threading
+
+try:
+    from pathlib import *
+except ImportError:
+    from pathlib2 import *
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .thumbindex import normPath, hasValidThumb
+from .sequences import collapseSequences
+
+imExts = ["png", "jpg", "jpeg", "tga", "tiff", "exr", "hdr", "bmp", "tif", "gif", "dpx", "svg"]
+IMAGE_EXTS = frozenset(e.lower() for e in imExts)
+
+
+def isImageName(name):
+    dot = name.rfind('.')
+    return dot > 0 and name[dot + 1:].lower() in IMAGE_EXTS
+
+
+def _listDir(directory):
+    # (image entries, subdirectory paths) for one folder
+    images = []
+    subdirs = []
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return images, subdirs
+    try:
+        for entry in it:
+            try:
+                if isImageName(entry.name):
+                    if entry.is_file():
+                        images.append(entry)
+                elif entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+    return images, subdirs
+
+
+def walkImageDirs(root, recurse=False, threads=1):
+    # yields (directory, [DirEntry]) one folder at a time, so callers can batch per-directory work
+    root = str(root)
+    if not recurse:
+        yield root, _listDir(root)[0]
+        return
+    if threads > 1:
+        for item in _parallelWalk(root, threads):
+            yield item
+        return
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        images, subdirs = _listDir(d)
+        stack.extend(reversed(subdirs))
+        if images:
+            yield d, images
+
+
+def _parallelWalk(root, threads):
+    # folders are listed on a pool of threads, results come back in completion order
+    todo = queue.Queue()
+    results = queue.Queue()
+    state = {'pending': 1, 'stop': False}
+    lock = threading.Lock()
+    done = object()
+    todo.put(root)
+
+    def work():
+        while True:
+            d = todo.get()
+            if d is done or state['stop']:
+                return
+            images, subdirs = _listDir(d)
+            # one critical section, so no thread can see the count reach zero and post done before this result
+            with lock:
+                state['pending'] += len(subdirs) - 1
+                for s in subdirs:
+                    todo.put(s)
+                results.put((d, images))
+                if state['pending'] == 0:
+                    results.put(done)
+
+    workers = [threading.Thread(target=work) for i in range(threads)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            if item[1]:
+                yield item
+    finally:
+        state['stop'] = True  # consumer stopped early or the walk is complete
+        for w in workers:
+            todo.put(done)
+
+
+def iterImageEntries(root, recurse=False, threads=1):
+    for d, entries in walkImageDirs(root, recurse, threads):
+        for entry in entries:
+            yield entry
+
+
+def iterImages(p, recurse=False, threads=1):
+    # lazy version of getImages, lets callers start work before a large walk finishes
+    for entry in iterImageEntries(p, recurse, threads):
+        yield Path(entry.path)
+
+
+def getImages(p, recurse=False, threads=1):
+    return list(iterImages(p, recurse, threads))
+
+
+def findPending(roots, store, index, force=False, useFingerprint=False, counts=None, threads=1, collapse=False, mapPath=None):
+    # yields (path, size) for images under roots without a current thumb, querying the index once per directory.
+    # with collapse only the first file of each sequence or UDIM set is considered, as that is all the panel shows.
+    # mapPath (a thumbindex.PathMap) turns local paths into the ones the cache is keyed by
+    mapPath = mapPath or normPath
+    for root in roots:
+        for d, entries in walkImageDirs(root, True, threads):
+            if collapse:
+                entries = [entry for entry, seq in collapseSequences(entries)]
+            records = index.lookupDir(mapPath(d)) if index else {}
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                key = mapPath(entry.path)
+                if not force and hasValidThumb(entry.path, records.get(key), store, index, useFingerprint, st, key):
+                    if counts is not None:
+                        counts['skipped'] += 1
+                    continue
+                yield entry.path, st.st_size
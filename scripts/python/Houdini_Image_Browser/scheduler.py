@@ -0,0 +1,119 @@
+'''
+Visible-first scheduling for thumbnail jobs
+
+Pending jobs are ranked selected item first, then rows in the viewport, then the prefetch window, then the rest,
+each tier ordered by distance from the viewport. Ranks are recomputed whenever the viewport moves.
+Runner threads pull jobs with pop() so queued work can be reordered right up until it starts.
+'''
+import heapq, threading
+
+SELECTED, VISIBLE, PREFETCH, BACKGROUND = range(4)
+
+
+class ThumbScheduler(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # key (list row) -> payload
+        self.ranks = {}  # key -> current rank tuple
+        self.heap = []  # (rank, key), entries whose rank no longer matches self.ranks are skipped
+        self.visible = (0, -1)
+        self.margin = 0
+        self.selected = None
+        self.runners = 0
+
+    def _rank(self, key):
+        if key == self.selected:
+            return (SELECTED, 0, key)
+        first, last = self.visible
+        if key < first:
+            dist = first - key
+        elif key > last:
+            dist = key - last
+        else:
+            return (VISIBLE, 0, key)
+        return (PREFETCH if dist <= self.margin else BACKGROUND, dist, key)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def add(self, key, payload):
+        with self.lock:
+            self.pending[key] = payload
+            rank = self._rank(key)
+            self.ranks[key] = rank
+            heapq.heappush(self.heap, (rank, key))
+
+    def pop(self):
+        # next job as (key, payload), or None once empty. a runner getting None must exit, it is no longer counted
+        with self.lock:
+            while self.heap:
+                rank, key = heapq.heappop(self.heap)
+                if self.ranks.get(key) == rank:
+                    del self.ranks[key]
+                    return key, self.pending.pop(key)
+            self.runners -= 1
+            return None
+
+    def release(self):
+        # a runner leaving with jobs still queued, e.g. to make way for more urgent work. it is no longer counted
+        with self.lock:
+            self.runners -= 1
+
+    def wantsRunner(self, maxRunners):
+        # called before starting a runner thread, claims a slot if there is work for it
+        with self.lock:
+            if self.runners < maxRunners and self.runners < len(self.pending):
+                self.runners += 1
+                return True
+            return False
+
+    def reprioritize(self, first, last, margin):
+        with self.lock:
+            self.visible = (first, last)
+            self.margin = margin
+            self._rebuild()
+
+    def promote(self, key):
+        # move one job to the front, e.g. the item clicked for the large preview
+        with self.lock:
+            previous, self.selected = self.selected, key
+            for k in (previous, key):
+                if k in self.pending:
+                    rank = self._rank(k)
+                    self.ranks[k] = rank
+                    heapq.heappush(self.heap, (rank, k))
+
+    def removeKey(self, key):
+        # the list row for key was deleted, drop its job and shift later keys up by one
+        def shift(k):
+            return k - 1 if k > key else k
+        with self.lock:
+            self.pending.pop(key, None)
+            self.pending = dict((shift(k), v) for k, v in self.pending.items())
+            if self.selected == key:
+                self.selected = None
+            elif self.selected is not None:
+                self.selected = shift(self.selected)
+            self._rebuild()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.pending
+
+    def discard(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+            self.ranks.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.ranks.clear()
+            self.heap = []
+            self.selected = None
+
+    def _rebuild(self):
+        self.ranks = dict((key, self._rank(key)) for key in self.pending)
+        self.heap = [(rank, key) for key, rank in self.ranks.items()]
+        heapq.heapify(self.heap)
@@ -0,0 +1,86 @@
+'''
+Substring search over file names (no Qt or hou imports)
+
+TrigramIndex maps every three character run of the lower-cased names to the ids of the names containing it.
+A query walks the postings of its rarest trigram and confirms each candidate with a plain substring test,
+so the cost follows the number of candidates rather than the number of names, and a limit stops it early.
+Queries shorter than three characters fall back to a scan.
+'''
+import os, threading
+from array import array
+
+
+def trigrams(text):
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class TrigramIndex(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.names = []  # lower-cased, id is the position
+        self.postings = {}  # trigram -> array of ids, ascending
+
+    def __len__(self):
+        return len(self.names)
+
+    def extend(self, names):
+        # ids continue from the current length. safe to call from a builder thread while searches run,
+        # feed large libraries in chunks so a search never waits long for the lock
+        with self.lock:
+            postings = self.postings
+            i = len(self.names)
+            for name in names:
+                low = name.lower()
+                self.names.append(low)
+                for g in trigrams(low):
+                    p = postings.get(g)
+                    if p is None:
+                        p = postings[g] = array('I')
+                    p.append(i)
+                i += 1
+
+    def search(self, query, limit=None):
+        # ascending ids whose name contains query, case-insensitive
+        q = query.lower()
+        with self.lock:
+            names = self.names
+            if not q:
+                ids = range(len(names))
+            elif len(q) < 3:
+                ids = (i for i, n in enumerate(names) if q in n)
+            else:
+                rarest = min((self.postings.get(g, ()) for g in trigrams(q)), key=len)
+                ids = (i for i in rarest if q in names[i])
+            result = []
+            for i in ids:
+                result.append(i)
+                if limit and len(result) >= limit:
+                    break
+        return result
+
+
+class LibraryIndex(object):
+    # file name search over every path in the thumb index. update() catches up on records written since the last
+    # call (the index hands out increasing rowids), so only the first update after startup reads the whole table
+    def __init__(self):
+        self.names = TrigramIndex()
+        self.paths = []
+        self.seen = set()
+        self.lastRowid = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def update(self, thumbindex, chunk=2000, cancelled=None):
+        while not (cancelled and cancelled()):
+            rows = thumbindex.pathsAfter(self.lastRowid, chunk)
+            if not rows:
+                return
+            new = [p for rowid, p in rows if p not in self.seen]
+            self.seen.update(new)
+            self.paths.extend(new)  # paths first, an id returned by a concurrent search always has its path
+            self.names.extend(os.path.basename(p) for p in new)
+            self.lastRowid = rows[-1][0]
+
+    def search(self, query, limit=None):
+        return [self.paths[i] for i in self.names.search(query, limit)]
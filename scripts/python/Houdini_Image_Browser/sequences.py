@@ -0,0 +1,119 @@
+'''
+Image sequence and UDIM detection (no Qt or hou imports)
+
+Files in one folder whose names only differ in the last run of digits before the extension are grouped,
+e.g. render.1001.exr ... render.1240.exr or tex_diffuse.1001.tif ... tex_diffuse.1034.tif.
+A group is listed as its first file, which is also the only one that gets a thumbnail.
+
+Numbered variations are common in texture libraries (wood2.jpg, Rock_01.jpg, Rock_001.jpg) and must stay separate
+items, applying one would otherwise write a frame dependent path. A frame range needs the number after a "." with at
+least three digits of padding, or after a "_" with at least four (render_0001.exr). Unpadded numbers after a "."
+(Houdini's plain $F) need UNPADDED_MIN_COUNT files.
+
+Four digit numbers from 1001 to 1999 are read as UDIM tiles when the name mentions udim, when they start at 1001 and
+either stay within the first row of ten tiles or have tiles missing, or when they span several rows with tiles
+missing. A contiguous run starting anywhere else, or running on across a row boundary, is a frame range. Texture
+exports (Mat_BaseColor.1001.png ... .1005.png) therefore apply as <UDIM>, while a UDIM set of complete rows without
+"udim" in its name lists as frames, as does a render of up to ten frames numbered from 1001.
+'''
+import os, re
+
+SEQ_RE = re.compile(r'^(.*?)(\d+)(\.[^.]+)$')
+UDIM_HINT = re.compile(r'udim', re.IGNORECASE)
+FRAME_PADDING = {'.': 3, '_': 4}  # separator before the number -> least zero padded width read as frames
+UNPADDED_MIN_COUNT = 10
+
+
+class Sequence(object):
+    __slots__ = ('directory', 'head', 'tail', 'numbers', 'padding', 'udim')
+
+    def __init__(self, directory, head, tail, numbers, padding, udim):
+        self.directory = directory
+        self.head = head
+        self.tail = tail
+        self.numbers = numbers  # sorted frame or tile numbers
+        self.padding = padding  # 0 when the numbers are not zero padded
+        self.udim = udim
+
+    def token(self):
+        if self.udim:
+            return "<UDIM>"
+        return "$F%d" % self.padding if self.padding > 1 else "$F"
+
+    def pattern(self):
+        # file name with the Houdini token, e.g. tex.<UDIM>.exr or render.$F4.exr
+        return self.head + self.token() + self.tail
+
+    def tokenPath(self):
+        return os.path.join(self.directory, self.pattern())
+
+    def label(self):
+        first, last = self.numbers[0], self.numbers[-1]
+        if self.udim:
+            return "%s  (%d tiles)" % (self.pattern(), len(self.numbers))
+        missing = last - first + 1 - len(self.numbers)
+        if missing:
+            return "%s  (%d-%d, %d missing)" % (self.pattern(), first, last, missing)
+        return "%s  (%d-%d)" % (self.pattern(), first, last)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and self.pattern() == other.pattern() and self.numbers == other.numbers
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def looksLikeUdim(head, numbers, padding):
+    if padding != 4 or numbers[0] < 1001 or numbers[-1] > 1999:
+        return False
+    if UDIM_HINT.search(head):
+        return True
+    rows = (numbers[-1] - 1001) // 10 - (numbers[0] - 1001) // 10 + 1
+    contiguous = numbers[-1] - numbers[0] + 1 == len(numbers)
+    if numbers[0] == 1001 and rows == 1:
+        return True
+    return rows > 1 and not contiguous
+
+
+def looksLikeFrames(head, padding, count):
+    sep = head[-1:]
+    if sep not in FRAME_PADDING:
+        return False
+    if padding >= FRAME_PADDING[sep]:
+        return True
+    return sep == '.' and padding == 0 and count >= UNPADDED_MIN_COUNT
+
+
+def collapseSequences(entries, minCount=2):
+    # [(entry, Sequence or None)] with one item per sequence, entries need .name and .path (DirEntry)
+    groups = {}
+    order = []
+    for entry in entries:
+        m = SEQ_RE.match(entry.name)
+        if not m:
+            order.append((None, entry))
+            continue
+        key = (m.group(1), m.group(3))
+        if key not in groups:
+            groups[key] = []
+            order.append((key, entry))
+        groups[key].append((int(m.group(2)), m.group(2), entry))
+
+    items = []
+    for key, entry in order:
+        members = groups.get(key) if key else None
+        if not members or len(members) < minCount:
+            items.append((entry, None))
+            continue
+        members.sort(key=lambda m: m[0])
+        widths = set(len(m[1]) for m in members)
+        padding = widths.pop() if len(widths) == 1 else 0  # mixed widths means unpadded numbers
+        numbers = [m[0] for m in members]
+        head, tail = key
+        udim = looksLikeUdim(head, numbers, padding)
+        if not udim and not looksLikeFrames(head, padding, len(members)):
+            items.extend((m[2], None) for m in sorted(members, key=lambda m: m[2].name))
+            continue
+        rep = members[0][2]
+        items.append((rep, Sequence(os.path.dirname(rep.path), head, tail, numbers, padding, udim)))
+    return items
@@ -0,0 +1,249 @@
+'''
+Thumbnail generation pipeline
+
+No Qt or hou imports so this can also be used headless.
+Sources are decoded at the smallest size that still fills the thumbnail:
+ - JPEGs get a jpeg:size hint so libjpeg can DCT-scale while decoding
+ - embedded EXIF previews are used when they are at least thumbnail sized
+ - multi-resolution TIFFs use the smallest pyramid level that covers the thumbnail. Only TIFF / PTIF subimages are
+   read as levels, the frames of a GIF, pages of a PDF or parts of an EXR are different pictures
+ - PSDs only read the merged composite rather than every layer
+EXR/HDR sources are mapped to display on the downscaled buffer, see tonemap.py.
+
+With a ResourceGovernor the decode waits in governor.admit() until its estimated pixel memory fits the budget.
+
+Every step takes an optional CancelToken. It is checked between stages and polled by ImageMagick's
+progress monitor during decode and resize, so a cancelled job stops mid-read instead of finishing.
+'''
+import os, struct, contextlib
+
+from wand.api import library
+from wand.cdefs.magick_image import MagickProgressMonitor
+from wand.image import Image
+
+from .thumbindex import fingerprint
+from . import tonemap
+
+THUMB_SIZE = (650, 650)
+THUMB_QUALITY = 68
+PYRAMID_FORMATS = frozenset(['TIFF', 'TIF', 'PTIF'])
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken(object):
+    # shared by every job queued for one listing, cancelled when the listing is replaced
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+
+def readImage(img, filename, token=None):
+    # read into img, aborting from inside the decoder once token is cancelled
+    if token is None:
+        img.read(filename=filename)
+        return img
+    monitor = MagickProgressMonitor(lambda text, offset, span, data: not token.cancelled)
+    img._abortMonitor = monitor  # keep the callback alive as long as the wand, images read also inherit it
+    library.MagickSetProgressMonitor(img.wand, monitor, None)
+    try:
+        img.read(filename=filename)
+    except Exception:
+        token.check()
+        raise
+    token.check()
+    return img
+
+
+def imageChannels(img):
+    base = 1 if img.colorspace == 'gray' else 4 if img.colorspace == 'cmyk' else 3
+    return base + int(bool(img.alpha_channel))
+
+
+def probe(filepath):
+    # header-only read for the true size and format, plus the size of every subimage
+    with Image.ping(filename=filepath) as img:
+        info = {"width": img.width, "height": img.height, "format": img.format, "channels": imageChannels(img)}
+        info["levels"] = [(frame.width, frame.height) for frame in img.sequence]
+    return info
+
+
+def exifThumbnail(filepath, maxread=131072):
+    # JPEG bytes of the EXIF IFD1 thumbnail, if the file has one
+    try:
+        with open(filepath, 'rb') as f:
+            head = bytearray(f.read(maxread))
+        if head[:2] != b'\xff\xd8':
+            return None
+        pos = 2
+        while pos + 4 <= len(head) and head[pos] == 0xff:
+            marker = head[pos + 1]
+            seglen = struct.unpack('>H', bytes(head[pos + 2:pos + 4]))[0]
+            if marker == 0xe1 and head[pos + 4:pos + 10] == b'Exif\x00\x00':
+                return _tiffThumbnail(bytes(head[pos + 10:pos + 2 + seglen]))
+            if marker == 0xda:
+                return None  # start of scan, no more metadata segments
+            pos += 2 + seglen
+    except (IOError, OSError, struct.error, IndexError):
+        pass
+    return None
+
+
+def _tiffThumbnail(tiff):
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if not endian:
+        return None
+    ifd0 = struct.unpack(endian + 'I', tiff[4:8])[0]
+    count = struct.unpack(endian + 'H', tiff[ifd0:ifd0 + 2])[0]
+    ifd1 = struct.unpack(endian + 'I', tiff[ifd0 + 2 + 12 * count:ifd0 + 6 + 12 * count])[0]
+    if not ifd1:
+        return None
+    count = struct.unpack(endian + 'H', tiff[ifd1:ifd1 + 2])[0]
+    offset = length = None
+    for i in range(count):
+        entry = ifd1 + 2 + 12 * i
+        tag, kind, n, value = struct.unpack(endian + 'HHII', tiff[entry:entry + 12])
+        if tag == 0x0201:
+            offset = value
+        elif tag == 0x0202:
+            length = value
+    if offset and length and offset + length <= len(tiff):
+        return tiff[offset:offset + length]
+    return None
+
+
+def pyramidLevels(info):
+    # subimage sizes when the format stores reduced resolution copies of one image, otherwise none
+    if str(info.get("format", "")).upper() not in PYRAMID_FORMATS:
+        return []
+    return info["levels"]
+
+
+def pickLevel(levels, size):
+    # index of the smallest reduction of the first subimage that still covers the thumbnail box.
+    # a reduction keeps the base aspect ratio up to the rounding of each side to whole pixels
+    if len(levels) < 2:
+        return 0
+    bw, bh = levels[0]
+    best = 0
+    for i, (w, h) in enumerate(levels):
+        if not w or not h or w > bw or h > bh or abs(w * bh - h * bw) > bw + bh:
+            continue
+        if max(w, h) >= min(max(size), max(bw, bh)) and w * h < levels[best][0] * levels[best][1]:
+            best = i
+    return best
+
+
+def decodeSize(filepath, info, size=THUMB_SIZE):
+    # size openSource will decode at, before any EXIF preview is considered
+    w, h = info["width"], info["height"]
+    ext = os.path.splitext(filepath)[1][1:].lower()
+    if ext in ("jpg", "jpeg"):
+        for scale in (8, 4, 2):  # libjpeg DCT scaling, the largest reduction still at or above the jpeg:size hint
+            if w // scale >= size[0] * 2 and h // scale >= size[1] * 2:
+                return (-(-w // scale), -(-h // scale))
+        return (w, h)
+    if ext != "psd":
+        level = pickLevel(pyramidLevels(info), size)
+        if level:
+            return info["levels"][level]
+    return (w, h)
+
+
+def admitDecode(governor, filepath, info, size, token=None):
+    # context to decode in, waits for room in the governor's budget
+    if governor is None:
+        return contextlib.nullcontext()
+    w, h = decodeSize(filepath, info, size)
+    return governor.admit(governor.estimate(w, h, info["channels"]), token)
+
+
+def openSource(filepath, info, size=THUMB_SIZE, token=None):
+    ext = os.path.splitext(filepath)[1][1:].lower()
+    img = Image()
+    try:
+        if ext in ("jpg", "jpeg"):
+            preview = exifThumbnail(filepath)
+            if preview:
+                with Image.ping(blob=preview) as p:
+                    big_enough = max(p.size) >= min(max(size), max(info["width"], info["height"]))
+                if big_enough:
+                    img.read(blob=preview)
+                    return img
+            img.options['jpeg:size'] = '%dx%d' % (size[0] * 2, size[1] * 2)  # libjpeg picks a scale at or above this
+            return readImage(img, filepath, token)
+        if ext == "psd":
+            return readImage(img, filepath + "[0]", token)  # merged composite only
+        level = pickLevel(pyramidLevels(info), size)
+        if level:
+            return readImage(img, "%s[%d]" % (filepath, level), token)
+        return readImage(img, filepath, token)
+    except:
+        img.close()
+        raise
+
+
+def renderThumbnail(filepath, size=THUMB_SIZE, quality=THUMB_QUALITY, token=None, display=None, governor=None):
+    # returns (jpeg bytes, source info). display is a tonemap settings dict for HDR sources
+    if token:
+        token.check()
+    info = probe(filepath)
+    with admitDecode(governor, filepath, info, size, token), openSource(filepath, info, size, token) as img:
+        with img.convert('jpg') as i:
+            i.transform(resize='%dx%d>' % tuple(size))  # faster than resize
+            if token:
+                token.check()
+            if tonemap.isHDR(info):
+                with tonemap.displayImage(i, display) as d:
+                    d.format = 'jpeg'
+                    d.compression_quality = quality
+                    blob = d.make_blob('jpeg')
+            else:
+                i.compression_quality = quality
+                blob = i.make_blob('jpeg')
+    return blob, info
+
+
+def renderPreview(filepath, size, token=None, display=None, governor=None):
+    # 8 bit RGBA pixels of the source fitted inside size, for the large preview. returns (bytes, width, height)
+    if token:
+        token.check()
+    info = probe(filepath)
+    with admitDecode(governor, filepath, info, size, token), openSource(filepath, info, size, token) as img:
+        with Image(image=img.sequence[0]) if len(img.sequence) > 1 else img.clone() as i:  # first frame of animations
+            i.transform(resize='%dx%d>' % tuple(size))
+            if token:
+                token.check()
+            if tonemap.isHDR(info):
+                with tonemap.displayImage(i, display) as d:
+                    return d.make_blob('RGBA'), d.width, d.height
+            i.depth = 8
+            return i.make_blob('RGBA'), i.width, i.height
+
+
+def storeThumbnail(filepath, st, blob, info, store, index=None, useFingerprint=False, key=None):
+    # key is the path the cache is keyed by when it differs from the local one, see thumbindex.PathMap
+    key = filepath if key is None else key
+    thumbloc = store.put(key, blob)
+    if index:
+        fprint = fingerprint(filepath) if useFingerprint else None
+        index.record(key, thumbloc, st.st_mtime, st.st_size, info["width"], info["height"], info["channels"], info["format"], fprint)
+    return thumbloc
+
+
+def generateThumbnail(filepath, store, index=None, size=THUMB_SIZE, quality=THUMB_QUALITY, useFingerprint=False, token=None, display=None,
+                      governor=None, key=None):
+    st = os.stat(filepath)  # stat before reading so a write during generation invalidates the thumb
+    blob, info = renderThumbnail(filepath, size, quality, token, display, governor)
+    if token:
+        token.check()
+    storeThumbnail(filepath, st, blob, info, store, index, useFingerprint, key)
+    return str(filepath)
@@ -0,0 +1,196 @@
+'''
+Persistent thumbnail index
+
+Maps normalized source paths to their thumb location and source metadata, so a directory can be
+checked against the cache with one indexed query rather than a hash and stat per file.
+Safe to share between the GUI thread and thumbnail workers.
+
+On a local disk the database runs in WAL mode so readers don't block the writer. WAL needs every process using the
+database on the same host and a filesystem with working shared memory, it must not be used on NFS/SMB shares:
+processes on different machines would each see their own view and the index gets corrupted. With journal "auto"
+(ThumbIndexJournal in config.json) a ThumbPath on a network share, or one whose filesystem can't be determined,
+uses the rollback journal, which relies on the file locks network filesystems do support.
+'''
+import os, sys, sqlite3, threading, time, hashlib
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS thumbs (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    thumb TEXT,
+    mtime REAL,
+    size INTEGER,
+    width INTEGER,
+    height INTEGER,
+    channels INTEGER,
+    format TEXT,
+    generated REAL,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS thumbs_dir ON thumbs (dir);
+'''
+
+FIELDS = ["path", "dir", "thumb", "mtime", "size", "width", "height", "channels", "format", "generated", "fingerprint"]
+MIGRATIONS = {"fingerprint": "TEXT"}  # columns added after the first release of the index
+
+
+NETWORK_FS = frozenset(["nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs", "ceph", "glusterfs", "fuse.glusterfs", "lustre"])
+
+
+def isLocalPath(path):
+    # True when path is on a local disk, False for network shares or when it can't be told
+    path = os.path.realpath(str(path))
+    try:
+        if sys.platform == "win32":
+            if path.startswith("\\\\") or path.startswith("//"):
+                return False  # UNC share
+            import ctypes
+            drive = os.path.splitdrive(path)[0] + "\\"
+            return ctypes.windll.kernel32.GetDriveTypeW(drive) in (2, 3, 6)  # removable, fixed, ram disk. 4 is a mapped share
+        if os.path.exists("/proc/mounts"):
+            best, fstype = "", None
+            with open("/proc/mounts") as f:
+                for line in f:
+                    fields = line.split()
+                    mount = fields[1].replace("\\040", " ")
+                    if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) >= len(best):
+                        best, fstype = mount, fields[2]
+            return fstype is not None and fstype not in NETWORK_FS
+    except (OSError, AttributeError, IndexError):
+        pass
+    return False
+
+
+def normPath(p):
+    return str(p).replace('\\', '/')
+
+
+def normDir(p):
+    return normPath(p).rstrip('/')
+
+
+class PathMap(object):
+    # rewrites source paths to the form the cache is keyed by on other machines, e.g. "/mnt/textures=T:/textures"
+    # so thumbs a Linux farm node makes for /mnt/textures/... are found by a Windows panel browsing T:/textures/...
+    # the longest matching prefix wins, matches only end at a path separator
+    def __init__(self, rules=()):
+        self.rules = []
+        for rule in rules:
+            src, sep, dst = rule.partition('=')
+            if not sep or not src.strip():
+                raise ValueError("path mapping must look like SRC=DST: %r" % rule)
+            self.rules.append((normDir(src.strip()), normDir(dst.strip())))
+        self.rules.sort(key=lambda r: len(r[0]), reverse=True)
+
+    def __bool__(self):
+        return bool(self.rules)
+    __nonzero__ = __bool__
+
+    def __call__(self, path):
+        p = normPath(path)
+        for src, dst in self.rules:
+            if p == src or p.startswith(src + '/'):
+                return dst + p[len(src):]
+        return p
+
+
+def fingerprint(path, chunk=65536):
+    # cheap content hash: size plus the first and last chunk of the file
+    size = os.path.getsize(path)
+    h = hashlib.md5(str(size).encode('utf-8'))
+    with open(path, 'rb') as f:
+        h.update(f.read(chunk))
+        if size > chunk * 2:
+            f.seek(-chunk, os.SEEK_END)
+            h.update(f.read(chunk))
+    return h.hexdigest()
+
+
+def isCurrent(rec, st):
+    # a thumb is valid while the source keeps the mtime and size it had when the thumb was made
+    return rec['mtime'] == st.st_mtime and rec['size'] == st.st_size
+
+
+def hasValidThumb(path, rec, store, index=None, useFingerprint=False, st=None, key=None):
+    # key is the path the cache is keyed by when it differs from the local one, see PathMap
+    key = path if key is None else key
+    if rec is None:
+        return store.contains(key)  # only thumbs made before the index existed need this
+    if st is None:
+        st = os.stat(str(path))
+    if isCurrent(rec, st):
+        return True
+    if useFingerprint and rec['fingerprint'] and rec['size'] == st.st_size and fingerprint(str(path)) == rec['fingerprint']:
+        if index:
+            index.touch(key, st.st_mtime, st.st_size)
+        return True
+    return False
+
+
+class ThumbIndex(object):
+    def __init__(self, dbpath, journal="auto"):
+        # journal is "wal", "delete" (rollback journal) or "auto", WAL only when dbpath is on a local disk
+        self.dbpath = dbpath
+        self.lock = threading.Lock()
+        journal = str(journal or "auto").lower()
+        if journal not in ("wal", "delete"):
+            journal = "wal" if isLocalPath(os.path.dirname(os.path.abspath(dbpath))) else "delete"
+        self.journal = journal
+        self.conn = sqlite3.connect(dbpath, timeout=30, check_same_thread=False)  # other machines may hold the lock for a while
+        if journal == "wal":
+            self.conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        else:
+            self.conn.execute("PRAGMA busy_timeout=1000")  # don't hold up startup if the switch has to wait
+            try:
+                self.conn.execute("PRAGMA journal_mode=DELETE")  # also takes a cache created in WAL mode out of it
+            except sqlite3.OperationalError:
+                print("Thumb index is open elsewhere, could not switch it to the rollback journal yet")
+            self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(SCHEMA)
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(thumbs)")]
+        for name, kind in MIGRATIONS.items():
+            if name not in columns:
+                self.conn.execute("ALTER TABLE thumbs ADD COLUMN %s %s" % (name, kind))
+        self.conn.commit()
+
+    def _row(self, r):
+        return dict(zip(FIELDS, r)) if r else None
+
+    def get(self, path):
+        with self.lock:
+            r = self.conn.execute("SELECT %s FROM thumbs WHERE path = ?" % ", ".join(FIELDS), (normPath(path),)).fetchone()
+        return self._row(r)
+
+    def lookupDir(self, directory):
+        # all records for files directly inside directory, keyed by normalized path
+        with self.lock:
+            rows = self.conn.execute("SELECT %s FROM thumbs WHERE dir = ?" % ", ".join(FIELDS), (normDir(directory),)).fetchall()
+        return dict((r[0], self._row(r)) for r in rows)
+
+    def record(self, path, thumb, mtime=None, size=None, width=None, height=None, channels=None, fmt=None, fprint=None):
+        path = normPath(path)
+        row = (path, normDir(os.path.dirname(path)), thumb, mtime, size, width, height, channels, fmt, time.time(), fprint)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO thumbs (%s) VALUES (%s)" % (", ".join(FIELDS), ", ".join("?" * len(FIELDS))), row)
+            self.conn.commit()
+
+    def pathsAfter(self, rowid=0, limit=10000):
+        # [(rowid, path)] in rowid order. rewritten records get a new rowid, so this also picks up regenerated thumbs
+        with self.lock:
+            return self.conn.execute("SELECT rowid, path FROM thumbs WHERE rowid > ? ORDER BY rowid LIMIT ?", (rowid, limit)).fetchall()
+
+    def touch(self, path, mtime, size):
+        # source was rewritten with identical content, keep the thumb but take the new stat
+        with self.lock:
+            self.conn.execute("UPDATE thumbs SET mtime = ?, size = ? WHERE path = ?", (mtime, size, normPath(path)))
+            self.conn.commit()
+
+    def remove(self, path):
+        with self.lock:
+            self.conn.execute("DELETE FROM thumbs WHERE path = ?", (normPath(path),))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,198 @@
+'''
+Thumbnail storage backends
+
+FileThumbStore keeps one <md5>.jpg per source image in the thumb folder (the original layout).
+PackedThumbStore appends thumbs to a fixed set of shard files with an offset index next to each shard,
+so a large cache is a few hundred files and a read is one seek into an mmap.
+
+Both stores are keyed by the normalized source path and hold encoded JPEG bytes.
+Several processes may write to one packed cache (two panels sharing a ThumbPath, the panel and the batch CLI),
+each append takes an OS lock on the shard's .lock file so offsets always point at the writer's own bytes.
+'''
+import os, mmap, struct, hashlib, threading
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lockFile(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after about 10s, keep waiting
+                return
+            except OSError:
+                continue
+
+    def _unlockFile(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lockFile(f):
+        fcntl.lockf(f, fcntl.LOCK_EX)
+
+    def _unlockFile(f):
+        fcntl.lockf(f, fcntl.LOCK_UN)
+
+SHARDS = 256
+RECORD = struct.Struct("<16sQI")  # md5 digest, offset into the shard, length
+
+
+def thumbKey(path):
+    return hashlib.md5(str(path).replace('\\', '/').encode('utf-8'))
+
+
+class FileThumbStore(object):
+    def __init__(self, root):
+        self.root = root
+
+    def location(self, path):
+        return self.root + "/" + thumbKey(path).hexdigest() + ".jpg"
+
+    def contains(self, path):
+        return os.path.exists(self.location(path))
+
+    def get(self, path):
+        try:
+            with open(self.location(path), 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def put(self, path, data):
+        loc = self.location(path)
+        with open(loc, 'wb') as f:
+            f.write(data)
+        return loc
+
+    def close(self):
+        pass
+
+
+class _Shard(object):
+    def __init__(self, base):
+        self.datapath = base + ".pack"
+        self.idxpath = base + ".idx"
+        self.lockpath = base + ".lock"  # separate file, Windows locks are mandatory and would block readers of the pack
+        self.lock = threading.Lock()
+        self.entries = {}  # digest -> (offset, length)
+        self.idxread = 0  # bytes of the index file already loaded
+        self.mm = None
+        self.loaded = False
+
+    def _loadIndex(self):
+        # read any index records appended since the last load, later records override earlier ones
+        if not os.path.exists(self.idxpath):
+            return
+        with open(self.idxpath, 'rb') as f:
+            f.seek(self.idxread)
+            buf = f.read()
+        usable = len(buf) - len(buf) % RECORD.size  # ignore a partially written trailing record
+        for pos in range(0, usable, RECORD.size):
+            digest, offset, length = RECORD.unpack_from(buf, pos)
+            self.entries[digest] = (offset, length)
+        self.idxread += usable
+        self.loaded = True
+
+    def _map(self, end):
+        if self.mm is not None and len(self.mm) >= end:
+            return self.mm
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        with open(self.datapath, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mm
+
+    def find(self, digest):
+        with self.lock:
+            if not self.loaded:
+                self._loadIndex()
+            entry = self.entries.get(digest)
+            if entry is None:
+                self._loadIndex()  # pick up thumbs written by another process
+                entry = self.entries.get(digest)
+            return entry
+
+    def get(self, digest):
+        entry = self.find(digest)
+        if entry is None:
+            return None
+        offset, length = entry
+        with self.lock:
+            try:
+                mm = self._map(offset + length)
+            except (IOError, OSError, ValueError):
+                return None
+            if offset + length > len(mm):
+                return None
+            return mm[offset:offset + length]
+
+    def put(self, digest, data):
+        with self.lock:
+            if not self.loaded:
+                self._loadIndex()
+            with open(self.lockpath, 'ab') as lock:
+                _lockFile(lock)  # other processes append to the same shard
+                try:
+                    with open(self.datapath, 'ab') as f:
+                        f.seek(0, os.SEEK_END)
+                        offset = f.tell()
+                        f.write(data)
+                    # data is flushed before its index record so readers never see a record for missing bytes
+                    with open(self.idxpath, 'ab') as f:
+                        f.write(RECORD.pack(digest, offset, len(data)))
+                finally:
+                    _unlockFile(lock)
+            self._loadIndex()  # also takes in records other writers appended, idxread stays aligned with the file
+            return offset
+
+    def close(self):
+        with self.lock:
+            if self.mm is not None:
+                self.mm.close()
+                self.mm = None
+
+
+class PackedThumbStore(object):
+    def __init__(self, root):
+        self.root = root + "/packed"
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self.shards = [_Shard(self.root + "/%02x" % i) for i in range(SHARDS)]
+
+    def _shard(self, path):
+        digest = thumbKey(path).digest()
+        return self.shards[digest[0] if isinstance(digest[0], int) else ord(digest[0])], digest
+
+    def location(self, path):
+        shard, digest = self._shard(path)
+        return shard.datapath
+
+    def contains(self, path):
+        shard, digest = self._shard(path)
+        return shard.find(digest) is not None
+
+    def get(self, path):
+        shard, digest = self._shard(path)
+        return shard.get(digest)
+
+    def put(self, path, data):
+        shard, digest = self._shard(path)
+        offset = shard.put(digest, data)
+        return "%s@%d" % (shard.datapath, offset)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+BACKENDS = {"files": FileThumbStore, "packed": PackedThumbStore}
+
+
+def openThumbStore(root, backend="files"):
+    if backend not in BACKENDS:
+        print("Unknown thumb backend '%s', using files" % backend)
+        backend = "files"
+    return BACKENDS[backend](root)
@@ -0,0 +1,184 @@
+'''
+Tile pyramids for the full resolution viewer (no Qt or hou imports)
+
+A source is decoded once and cut into TILE_SIZE JPEG tiles at every power of two reduction, coarsest level first,
+under <thumbdir>/tiles/<path hash>/<level>/<x>_<y>.jpg. The viewer then only ever reads the tiles on screen,
+so its memory is bounded by the viewport and its tile cache rather than by the source.
+The one-off build holds the decoded source, large files rely on ImageMagick's pixel cache limits to spill to disk,
+and with a ResourceGovernor the build waits until the full resolution decode fits the decode budget.
+Each level is resized from the next finer one rather than from the source, so all reductions together cost about a
+third of one full resolution resize. Once they exist the admission shrinks to the source plus the reductions, leaving
+the rest of the budget to thumbnail and preview decodes while the tiles are written.
+HDR tiles get the fixed exposure and view transform of the thumbs, auto exposure would differ from tile to tile.
+A pyramid is rebuilt when the source mtime or size changes. Opening one touches its meta.json, pruneTiles() deletes
+the least recently opened pyramids once the tiles outgrow their disk cap.
+'''
+import os, json, time, shutil
+
+from wand.image import Image
+
+from .thumbstore import thumbKey
+from .governor import pixelBytes
+from . import thumbgen, tonemap
+
+TILE_SIZE = 256
+TILE_QUALITY = 90
+PRUNE_GRACE = 60.0  # seconds, pyramids opened or written this recently are never pruned, they may be in use
+
+
+def levelCount(width, height, tileSize=TILE_SIZE):
+    # levels until the whole image fits in one tile
+    levels = 1
+    while max(width, height) > tileSize << (levels - 1):
+        levels += 1
+    return levels
+
+
+class TilePyramid(object):
+    def __init__(self, root, filepath, tileSize=TILE_SIZE):
+        self.filepath = str(filepath)
+        self.dir = os.path.join(root, thumbKey(self.filepath).hexdigest())
+        self.tileSize = tileSize
+        self.meta = self.loadMeta()
+
+    def loadMeta(self):
+        try:
+            with open(os.path.join(self.dir, "meta.json"), 'r') as f:
+                meta = json.load(f)
+            st = os.stat(self.filepath)
+        except (IOError, OSError, ValueError):
+            return None
+        if meta.get('mtime') != st.st_mtime or meta.get('size') != st.st_size or meta.get('tileSize') != self.tileSize:
+            return None
+        try:
+            os.utime(os.path.join(self.dir, "meta.json"), None)  # last use for pruneTiles
+        except OSError:
+            pass
+        return meta
+
+    def saveMeta(self):
+        tmp = os.path.join(self.dir, "meta.json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.dir, "meta.json"))
+
+    def complete(self):
+        return bool(self.meta) and len(self.meta['ready']) == self.meta['levels']
+
+    def levelReady(self, level):
+        return bool(self.meta) and level in self.meta['ready']
+
+    def levelSize(self, level):
+        w, h = self.meta['width'], self.meta['height']
+        return (max(1, -(-w >> level)), max(1, -(-h >> level)))  # ceil division by 2**level
+
+    def tileGrid(self, level):
+        w, h = self.levelSize(level)
+        return (-(-w // self.tileSize), -(-h // self.tileSize))
+
+    def tilePath(self, level, tx, ty):
+        return os.path.join(self.dir, str(level), "%d_%d.jpg" % (tx, ty))
+
+    def build(self, token=None, progress=None, display=None, governor=None):
+        # decodes the source and writes every level, calling progress(level) as each one becomes readable
+        st = os.stat(self.filepath)
+        info = thumbgen.probe(self.filepath)
+        self.meta = {"mtime": st.st_mtime, "size": st.st_size, "tileSize": self.tileSize, "width": info["width"],
+                     "height": info["height"], "levels": levelCount(info["width"], info["height"], self.tileSize), "ready": []}
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+        display = dict(display or {}, auto=False) if tonemap.isHDR(info) else None
+        w, h = info["width"], info["height"]
+        need = governor.acquire(governor.estimate(w, h, info["channels"]), token) if governor else 0
+        reduced = []  # levels 1.. finest first, each resized from the one before
+        try:
+            with Image() as source:
+                thumbgen.readImage(source, self.filepath + "[0]", token)
+                finer = source
+                for level in range(1, self.meta['levels']):
+                    if token:
+                        token.check()
+                    img = finer.clone()
+                    reduced.append(img)
+                    img.resize(*self.levelSize(level))
+                    finer = img
+                if governor:
+                    need = governor.shrink(need, pixelBytes(w, h, info["channels"]) * 4 // 3)
+                for level in reversed(range(self.meta['levels'])):
+                    img = reduced.pop() if level else source
+                    try:
+                        self.writeLevel(img, level, token, display)
+                    finally:
+                        if level:
+                            img.close()
+                    self.meta['ready'].append(level)
+                    self.saveMeta()
+                    if progress:
+                        progress(level)
+        finally:
+            for img in reduced:
+                img.close()
+            if governor:
+                governor.release(need)
+
+    def writeLevel(self, img, level, token=None, display=None):
+        d = os.path.join(self.dir, str(level))
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        ts = self.tileSize
+        cols, rows = self.tileGrid(level)
+        for ty in range(rows):
+            for tx in range(cols):
+                if token:
+                    token.check()
+                with img[tx * ts:min(img.width, (tx + 1) * ts), ty * ts:min(img.height, (ty + 1) * ts)] as crop:
+                    with tonemap.displayImage(crop, display) if display is not None else crop.clone() as tile:
+                        tile.format = 'jpeg'
+                        tile.compression_quality = TILE_QUALITY
+                        blob = tile.make_blob()
+                path = self.tilePath(level, tx, ty)
+                with open(path + ".tmp", 'wb') as f:
+                    f.write(blob)
+                os.replace(path + ".tmp", path)  # never expose a half written tile to the viewer
+
+
+def dirSize(path):
+    total = 0
+    for d, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(d, name))
+            except OSError:
+                pass
+    return total
+
+
+def pruneTiles(root, maxBytes, keep=None):
+    # deletes the least recently opened pyramids under root until the rest fit in maxBytes, returns the bytes freed.
+    # keep is a pyramid dir which must stay, e.g. the one just built
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return 0
+    pyramids = []
+    for name in names:
+        d = os.path.join(root, name)
+        if not os.path.isdir(d):
+            continue
+        meta = os.path.join(d, "meta.json")
+        try:
+            used = os.path.getmtime(meta if os.path.exists(meta) else d)
+        except OSError:
+            continue
+        pyramids.append((used, d, dirSize(d)))
+    total = sum(size for used, d, size in pyramids)
+    now = time.time()
+    freed = 0
+    for used, d, size in sorted(pyramids):
+        if total - freed <= maxBytes:
+            break
+        if keep and os.path.normcase(d) == os.path.normcase(keep) or now - used < PRUNE_GRACE:
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        freed += size
+    return freed
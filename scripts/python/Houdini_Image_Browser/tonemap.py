@@ -0,0 +1,80 @@
+'''
+Display transforms for HDR sources (no Qt or hou imports)
+
+EXR, HDR and PFM files hold linear scene values, encoding them straight to JPEG clips everything above 1.
+displayImage() runs on the already downscaled buffer: exposure (fixed stops, plus optional auto exposure from the
+log-average luminance), then a view transform, plain sRGB or the ACES filmic curve fit by Krzysztof Narkowicz,
+in one vectorized NumPy pass over float pixels exported straight into an array.
+Without NumPy the exposure and sRGB encode are done with ImageMagick operators, auto exposure and ACES are skipped.
+'''
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from wand.image import Image
+
+HDR_FORMATS = frozenset(['EXR', 'HDR', 'PFM'])
+VIEWS = ('srgb', 'aces')
+DEFAULTS = {"exposure": 0.0, "view": "srgb", "auto": False, "key": 0.18}
+
+
+def displaySettings(config):
+    # settings dict from the HDR* keys in config.json
+    view = str(config.get('HDRView', DEFAULTS['view'])).lower()
+    return {"exposure": float(config.get('HDRExposure', DEFAULTS['exposure'])),
+            "view": view if view in VIEWS else DEFAULTS['view'],
+            "auto": bool(config.get('HDRAutoExposure', DEFAULTS['auto'])),
+            "key": float(config.get('HDRAutoExposureKey', DEFAULTS['key']))}
+
+
+def isHDR(info):
+    return str(info.get("format", "")).upper() in HDR_FORMATS
+
+
+def srgbEncode(x):
+    return numpy.where(x <= 0.0031308, x * 12.92, 1.055 * numpy.power(x, 1.0 / 2.4) - 0.055)
+
+
+def acesFilmic(x):
+    x = x * 0.6  # the fit maps the ACES RRT+ODT white, scaled so an exposure of 0 roughly matches the sRGB view
+    return (x * (2.51 * x + 0.03)) / (x * (2.43 * x + 0.59) + 0.14)
+
+
+def autoExposure(rgb, key=0.18):
+    # stops that bring the log-average luminance to key, the photographic middle grey
+    lum = rgb[..., 0] * 0.2126 + rgb[..., 1] * 0.7152 + rgb[..., 2] * 0.0722
+    average = numpy.exp(numpy.mean(numpy.log(numpy.maximum(lum, 0.0) + 1e-6)))
+    return float(numpy.log2(key / max(average, 1e-6)))
+
+
+def displayPixels(rgb, exposure=0.0, view="srgb", auto=False, key=0.18):
+    # linear float32 (h, w, 3) -> display referred uint8 (h, w, 3)
+    rgb = numpy.nan_to_num(rgb, copy=False)
+    if auto:
+        exposure += autoExposure(rgb, key)
+    x = rgb * numpy.float32(2.0 ** exposure)
+    if view == "aces":
+        x = acesFilmic(x)
+    x = srgbEncode(numpy.clip(x, 0.0, 1.0))
+    return (x * 255.0 + 0.5).astype(numpy.uint8)
+
+
+def displayImage(img, settings=None):
+    # new 8 bit sRGB Image of img mapped for display, alpha is dropped. the caller closes both
+    s = dict(DEFAULTS, **(settings or {}))
+    if numpy is None:
+        out = img.clone()
+        out.alpha_channel = 'remove'
+        if s["exposure"]:
+            out.evaluate('multiply', 2.0 ** s["exposure"])
+        out.colorspace = 'rgb'  # values are linear, let ImageMagick apply the sRGB curve
+        out.transform_colorspace('srgb')
+        out.clamp()
+        out.depth = 8
+        return out
+    width, height = img.size
+    rgb = numpy.empty((height, width, 3), numpy.float32)
+    img.export_pixels(channel_map='RGB', storage='float', out=rgb)  # straight into the array, values above 1 survive in HDRI builds
+    pixels = displayPixels(rgb, s["exposure"], s["view"], s["auto"], s["key"])
+    return Image(blob=pixels.tobytes(), format='rgb', width=width, height=height, depth=8)
@@ -0,0 +1,237 @@
+'''
+Zoomable full resolution viewer
+
+Draws the tiles of a TilePyramid which intersect the window at the level matching the zoom. Missing tiles are
+loaded from disk on a small pool and kept in an LRU with its own byte budget, coarser cached levels fill in
+underneath until they arrive. The pyramid is built in the background the first time a file is opened.
+
+Mouse wheel zooms around the cursor, drag to pan, F fits the image, 1 shows it at 100%.
+'''
+import os, math, traceback
+
+from PySide2.QtGui import *
+from PySide2.QtWidgets import *
+from PySide2.QtCore import *
+
+from .tiles import TilePyramid, pruneTiles
+from .imagecache import ImageCache
+from . import thumbgen
+
+
+class TileSignals(QObject):
+    loaded = Signal(object, object)
+    built = Signal(int)
+    failed = Signal(str)
+
+
+class TileLoader(QRunnable):
+    # Reads one tile JPEG, skipped if the viewer scrolled away before it started
+    def __init__(self, viewer, key, path):
+        super(TileLoader, self).__init__()
+        self.viewer = viewer
+        self.key = key
+        self.path = path
+        self.signals = TileSignals()
+
+    @Slot()
+    def run(self):
+        if self.key not in self.viewer.wanted:
+            self.signals.loaded.emit(self.key, None)
+            return
+        qim = QImage(self.path)
+        self.signals.loaded.emit(self.key, None if qim.isNull() else qim)
+
+
+class PyramidBuilder(QRunnable):
+    # Builds the pyramid, then prunes the other pyramids under its root down to diskLimit bytes (0 keeps them all)
+    def __init__(self, pyramid, token, display=None, governor=None, diskLimit=0):
+        super(PyramidBuilder, self).__init__()
+        self.pyramid = pyramid
+        self.token = token
+        self.display = display
+        self.governor = governor
+        self.diskLimit = diskLimit
+        self.signals = TileSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            self.pyramid.build(self.token, self.signals.built.emit, self.display, self.governor)
+            if self.diskLimit:
+                pruneTiles(os.path.dirname(self.pyramid.dir), self.diskLimit, keep=self.pyramid.dir)
+        except thumbgen.Cancelled:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+
+
+class TileViewer(QWidget):
+    def __init__(self, filepath, tileRoot, cacheBudget=128 * 1048576, preview=None, display=None, governor=None, diskLimit=0,
+                 parent=None):
+        super(TileViewer, self).__init__(parent, Qt.Window)
+        self.setWindowTitle(str(filepath))
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.resize(1280, 800)
+        self.pyramid = TilePyramid(tileRoot, filepath)
+        self.tiles = ImageCache(cacheBudget, lambda qim: qim.sizeInBytes())
+        self.preview = preview  # shown while the first level is built
+        self.zoom = 1.0  # window pixels per source pixel
+        self.offset = QPointF(0, 0)  # source position at the window's top left
+        self.fitted = False
+        self.dragStart = None
+        self.wanted = set()  # keys on screen at the last paint, read by the loaders
+        self.loading = set()
+        self.status = ""
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+        self.buildpool = QThreadPool()
+        self.buildpool.setMaxThreadCount(1)
+        self.token = thumbgen.CancelToken()
+        if not self.pyramid.complete():
+            self.status = "building tiles..."
+            builder = PyramidBuilder(self.pyramid, self.token, display, governor, diskLimit)
+            builder.signals.built.connect(self.levelBuilt)
+            builder.signals.failed.connect(self.buildFailed)
+            self.buildpool.start(builder)
+
+    '''
+    View state
+    '''
+
+    def levelFor(self, zoom):
+        level = int(math.floor(math.log(1.0 / zoom, 2))) if zoom < 1 else 0
+        return max(0, min(level, self.pyramid.meta['levels'] - 1))
+
+    def fit(self):
+        if not self.pyramid.meta:
+            return
+        w, h = self.pyramid.meta['width'], self.pyramid.meta['height']
+        self.zoom = min(self.width() / float(w), self.height() / float(h))
+        self.offset = QPointF((w - self.width() / self.zoom) / 2.0, (h - self.height() / self.zoom) / 2.0)
+        self.fitted = True
+        self.update()
+
+    def zoomAt(self, pos, factor):
+        anchor = self.offset + QPointF(pos) / self.zoom
+        self.zoom = max(1e-3, min(self.zoom * factor, 32.0))
+        self.offset = anchor - QPointF(pos) / self.zoom
+        self.update()
+
+    def levelBuilt(self, level):
+        if not self.fitted:
+            self.fit()
+        if level == 0:
+            self.status = ""
+        self.update()
+
+    def buildFailed(self, message):
+        self.status = "could not build tiles: " + message.splitlines()[0] if message else "could not build tiles"
+        self.update()
+
+    def tileLoaded(self, key, qim):
+        self.loading.discard(key)
+        if qim is not None:
+            self.tiles.put(key, qim)
+            self.update()
+
+    '''
+    Painting
+    '''
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.zoom < 1)
+        meta = self.pyramid.meta
+        ready = [l for l in range(meta['levels'] - 1, -1, -1) if self.pyramid.levelReady(l)] if meta else []
+        if not ready:
+            if self.preview is not None and not self.preview.isNull():
+                scaled = self.preview.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                painter.drawImage((self.width() - scaled.width()) // 2, (self.height() - scaled.height()) // 2, scaled)
+        else:
+            # coarse to fine, finer tiles paint over the coarser ones. tiles are requested for the coarsest level,
+            # which is always complete underneath, and the finest ready level up to the one matching the zoom
+            levels = [l for l in ready if l >= self.levelFor(self.zoom)]
+            wanted = set()
+            for level in levels:
+                self.drawLevel(painter, level, wanted if level in (levels[0], levels[-1]) else None)
+            self.wanted = wanted
+        if self.status:
+            painter.setPen(Qt.white)
+            painter.drawText(self.rect().adjusted(8, 8, -8, -8), Qt.AlignLeft | Qt.AlignBottom, self.status)
+        painter.end()
+
+    def drawLevel(self, painter, level, wanted=None):
+        # draws the cached tiles of level on screen. with wanted, missing ones are requested and their keys added
+        ts = self.pyramid.tileSize
+        scale = float(1 << level)  # source pixels per level pixel
+        cols, rows = self.pyramid.tileGrid(level)
+        x0 = int(max(0, self.offset.x() / scale // ts))
+        y0 = int(max(0, self.offset.y() / scale // ts))
+        x1 = int(min(cols - 1, (self.offset.x() + self.width() / self.zoom) / scale // ts))
+        y1 = int(min(rows - 1, (self.offset.y() + self.height() / self.zoom) / scale // ts))
+        for ty in range(y0, y1 + 1):
+            for tx in range(x0, x1 + 1):
+                key = (self.pyramid.filepath, ('tile', level, tx, ty))
+                qim = self.tiles.get(key)
+                if qim is None:
+                    if wanted is not None:
+                        wanted.add(key)
+                        self.requestTile(key, level, tx, ty)
+                    continue
+                src = QPointF(tx * ts * scale, ty * ts * scale)
+                topLeft = (src - self.offset) * self.zoom
+                rect = QRectF(topLeft, QSizeF(qim.width() * scale * self.zoom, qim.height() * scale * self.zoom))
+                painter.drawImage(rect, qim)
+
+    def requestTile(self, key, level, tx, ty):
+        if key in self.loading:
+            return
+        self.loading.add(key)
+        loader = TileLoader(self, key, self.pyramid.tilePath(level, tx, ty))
+        loader.signals.loaded.connect(self.tileLoaded)
+        self.pool.start(loader)
+
+    '''
+    Input
+    '''
+
+    def resizeEvent(self, event):
+        if not self.fitted:
+            self.fit()
+        super(TileViewer, self).resizeEvent(event)
+
+    def wheelEvent(self, event):
+        self.zoomAt(event.pos(), 1.25 ** (event.angleDelta().y() / 120.0))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.dragStart = (event.pos(), QPointF(self.offset))
+
+    def mouseMoveEvent(self, event):
+        if self.dragStart:
+            pos, offset = self.dragStart
+            self.offset = offset - QPointF(event.pos() - pos) / self.zoom
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.dragStart = None
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F:
+            self.fit()
+        elif event.key() == Qt.Key_1:
+            self.zoomAt(QPoint(self.width() // 2, self.height() // 2), 1.0 / self.zoom)
+        else:
+            super(TileViewer, self).keyPressEvent(event)
+
+    def closeEvent(self, event):
+        self.token.cancel()
+        self.wanted = set()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.buildpool.waitForDone()
+        self.tiles.clear()
+        event.accept()
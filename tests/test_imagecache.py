@@ -0,0 +1,49 @@
+'''
+Decoded image cache, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.imagecache import ImageCache
+
+
+def test_evicts_least_recently_used_over_budget():
+    cache = ImageCache(100, len)
+    cache.put(("a", 64), b"a" * 40)
+    cache.put(("b", 64), b"b" * 40)
+    assert cache.get(("a", 64)) == b"a" * 40  # b is now the oldest
+    cache.put(("c", 64), b"c" * 40)
+    assert cache.get(("b", 64)) is None
+    assert cache.get(("a", 64)) and cache.get(("c", 64))
+    assert cache.stats()["bytes"] == 80
+
+
+def test_replacing_an_entry_keeps_the_byte_count():
+    cache = ImageCache(100, len)
+    cache.put(("a", 64), b"x" * 30)
+    cache.put(("a", 64), b"x" * 50)
+    assert cache.stats()["bytes"] == 50 and cache.stats()["entries"] == 1
+
+
+def test_oversized_value_is_not_cached():
+    cache = ImageCache(100, len)
+    cache.put(("a", 64), b"a" * 60)
+    cache.put(("huge", 64), b"h" * 101)
+    assert cache.get(("huge", 64)) is None
+    assert cache.get(("a", 64)) == b"a" * 60
+
+
+def test_invalidate_drops_every_size_of_a_source():
+    cache = ImageCache(1000, len)
+    cache.put(("a", 64), b"small")
+    cache.put(("a", 512), b"large")
+    cache.put(("b", 64), b"other")
+    cache.invalidate("a")
+    assert cache.get(("a", 64)) is None and cache.get(("a", 512)) is None
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == 5
+    assert stats["hits"] == 0 and stats["misses"] == 2
@@ -0,0 +1,38 @@
+'''
+Headless checks for the panel's background workers, run from the repository root with
+
+    python -m pytest tests
+
+Qt runs on the offscreen platform. Skipped unless PySide2 and ImageMagick (through the bundled wand) are importable.
+'''
+import os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "scripts", "python"), os.path.join(ROOT, "python3.9libs" if sys.version_info >= (3, 9) else "python3.7libs")]
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import PySide2, wand.image
+except ImportError:
+    pytest.skip("needs PySide2 and the ImageMagick library", allow_module_level=True)
+
+from Houdini_Image_Browser.HImageThreaded import ScanWorker
+from Houdini_Image_Browser.thumbstore import openThumbStore
+
+
+def test_scan_lists_images(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for name in ("a.jpg", "b.png", "notes.txt"):
+        (folder / name).write_bytes(b"")
+    store = openThumbStore(str(tmp_path / "thumbs"), "files")
+    worker = ScanWorker(str(folder), 1, store, collapse=False)
+    rows, finished = [], []
+    worker.signals.batch.connect(lambda generation, batch: rows.extend(batch))
+    worker.signals.finished.connect(lambda generation, count: finished.append(count))
+    worker.run()  # same thread, the signals are delivered directly
+    assert sorted(os.path.basename(p) for p, cached, seq in rows) == ["a.jpg", "b.png"]
+    assert not any(cached for p, cached, seq in rows)
+    assert finished == [2]
@@ -0,0 +1,68 @@
+'''
+Visible-first thumbnail job ordering, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.scheduler import ThumbScheduler
+
+
+def drain(sched):
+    keys = []
+    job = sched.pop()
+    while job is not None:
+        keys.append(job[0])
+        job = sched.pop()
+    return keys
+
+
+def makeScheduler(count, first, last, margin):
+    sched = ThumbScheduler()
+    for key in range(count):
+        sched.add(key, "job%d" % key)
+    sched.reprioritize(first, last, margin)
+    return sched
+
+
+def test_visible_rows_then_nearest():
+    sched = makeScheduler(10, 4, 5, 1)
+    assert drain(sched) == [4, 5, 3, 6, 2, 7, 1, 8, 0, 9]
+
+
+def test_promote_moves_one_job_first_and_back():
+    sched = makeScheduler(10, 4, 5, 1)
+    sched.promote(9)
+    assert sched.pop() == (9, "job9")
+    sched.add(9, "job9")
+    sched.promote(0)  # 9 loses the selection and drops back to its distance from the viewport
+    assert drain(sched)[:4] == [0, 4, 5, 3]
+
+
+def test_remove_key_shifts_later_rows():
+    sched = makeScheduler(6, 0, 5, 0)
+    sched.promote(4)
+    sched.removeKey(2)
+    assert 5 not in sched and len(sched) == 5
+    assert sched.pop() == (3, "job4")  # the selection follows its row
+    assert [sched.pop() for i in range(4)] == [(0, "job0"), (1, "job1"), (2, "job3"), (4, "job5")]
+
+
+def test_removing_the_selected_row_clears_it():
+    sched = makeScheduler(4, 0, 0, 0)
+    sched.promote(3)
+    sched.removeKey(3)
+    assert drain(sched) == [0, 1, 2]
+
+
+def test_runner_slots():
+    sched = makeScheduler(2, 0, 1, 0)
+    assert sched.wantsRunner(4) and sched.wantsRunner(4)
+    assert not sched.wantsRunner(4)  # no more runners than jobs
+    drain(sched)
+    assert sched.runners == 1  # the None from pop() released one slot
+    sched.release()
+    assert sched.runners == 0
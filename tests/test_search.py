@@ -0,0 +1,32 @@
+'''
+Trigram file name search, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.search import TrigramIndex
+
+NAMES = ["Wood_Oak_Diffuse.jpg", "wood_pine_rough.exr", "Brick_Red.png", "oak_leaves.tif", "Rock.exr"]
+
+
+def brute(query):
+    return [i for i, n in enumerate(NAMES) if query.lower() in n.lower()]
+
+
+def test_matches_substring_scan():
+    index = TrigramIndex()
+    index.extend(NAMES[:2])
+    index.extend(NAMES[2:])  # ids continue across chunks
+    for query in ["oak", "OAK_", "wood", ".exr", "k_r", "ro", "", "missing", "diffuse.jpg"]:
+        assert index.search(query) == brute(query), query
+
+
+def test_limit_keeps_the_first_ids():
+    index = TrigramIndex()
+    index.extend(NAMES)
+    assert index.search("o", limit=2) == brute("o")[:2]
+    assert index.search(".exr", limit=1) == [1]
@@ -0,0 +1,58 @@
+'''
+Sequence and UDIM grouping, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.sequences import collapseSequences
+
+
+class Entry(object):
+    def __init__(self, name):
+        self.name = name
+        self.path = "/lib/" + name
+
+
+def labels(names):
+    return [(entry.name, seq.label() if seq else None) for entry, seq in collapseSequences([Entry(n) for n in names])]
+
+
+def test_first_row_texture_set_is_udim():
+    names = ["Mat_BaseColor.%d.png" % n for n in range(1001, 1006)]
+    items = collapseSequences([Entry(n) for n in names])
+    assert len(items) == 1
+    entry, seq = items[0]
+    assert entry.name == "Mat_BaseColor.1001.png"
+    assert seq.udim and seq.tokenPath() == "/lib/Mat_BaseColor.<UDIM>.png"
+
+
+def test_gapped_multi_row_set_is_udim():
+    assert labels(["tex.%d.exr" % n for n in (1001, 1002, 1011, 1012)]) == [("tex.1001.exr", "tex.<UDIM>.exr  (4 tiles)")]
+
+
+def test_hint_makes_udim():
+    assert collapseSequences([Entry("diffuse_udim.%d.tif" % n) for n in range(1011, 1031)])[0][1].udim
+
+
+def test_range_starting_elsewhere_is_frames():
+    items = collapseSequences([Entry("render.%04d.exr" % n) for n in range(1003, 1008)])
+    assert len(items) == 1 and not items[0][1].udim
+    assert items[0][1].tokenPath() == "/lib/render.$F4.exr"
+
+
+def test_contiguous_range_across_rows_is_frames():
+    assert labels(["render.%04d.exr" % n for n in range(1001, 1241)]) == [("render.1001.exr", "render.$F4.exr  (1001-1240)")]
+
+
+def test_numbered_variations_stay_separate():
+    names = ["wood2.jpg", "wood3.jpg", "Rock_01.jpg", "Rock_02.jpg", "Rock_001.jpg", "Rock_002.jpg"]
+    assert sorted(name for name, label in labels(names) if label is None) == sorted(names)
+
+
+def test_unpadded_frames_need_more_files():
+    assert all(label is None for name, label in labels(["shot.%d.exr" % n for n in range(1, 4)]))
+    assert labels(["shot.%d.exr" % n for n in range(1, 13)]) == [("shot.1.exr", "shot.$F.exr  (1-12)")]
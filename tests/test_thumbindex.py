@@ -0,0 +1,83 @@
+'''
+Thumb index records and invalidation, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.thumbindex import ThumbIndex, PathMap, hasValidThumb, normPath
+from Houdini_Image_Browser.thumbstore import openThumbStore
+
+
+def makeSource(folder, name, data=b"pixels"):
+    path = folder / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def recordSource(index, path):
+    st = os.stat(path)
+    index.record(path, "thumb", st.st_mtime, st.st_size)
+
+
+def test_lookup_dir_only_returns_direct_children(tmp_path):
+    index = ThumbIndex(str(tmp_path / "index.db"), "delete")
+    (tmp_path / "sub").mkdir()
+    a = makeSource(tmp_path, "a.jpg")
+    b = makeSource(tmp_path / "sub", "b.jpg")
+    recordSource(index, a)
+    recordSource(index, b)
+    assert list(index.lookupDir(str(tmp_path))) == [normPath(a)]
+    assert list(index.lookupDir(str(tmp_path / "sub") + "/")) == [normPath(b)]
+    index.close()
+
+
+def test_thumb_goes_stale_when_mtime_or_size_change(tmp_path):
+    index = ThumbIndex(str(tmp_path / "index.db"), "delete")
+    store = openThumbStore(str(tmp_path), "files")
+    path = makeSource(tmp_path, "a.exr")
+    recordSource(index, path)
+    assert hasValidThumb(path, index.get(path), store, index)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert not hasValidThumb(path, index.get(path), store, index)
+    recordSource(index, path)
+    with open(path, "ab") as f:
+        f.write(b"more")
+    os.utime(path, (st.st_atime, st.st_mtime + 10))  # same mtime as recorded, only the size differs
+    assert not hasValidThumb(path, index.get(path), store, index)
+    index.close()
+
+
+def test_fingerprint_keeps_rewritten_identical_source(tmp_path):
+    index = ThumbIndex(str(tmp_path / "index.db"), "delete")
+    store = openThumbStore(str(tmp_path), "files")
+    path = makeSource(tmp_path, "a.tif")
+    st = os.stat(path)
+    from Houdini_Image_Browser.thumbindex import fingerprint
+    index.record(path, "thumb", st.st_mtime, st.st_size, fprint=fingerprint(path))
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert not hasValidThumb(path, index.get(path), store, index)
+    assert hasValidThumb(path, index.get(path), store, index, useFingerprint=True)
+    assert index.get(path)["mtime"] == os.stat(path).st_mtime  # touched, the next check is a plain stat compare
+    index.close()
+
+
+def test_untracked_file_falls_back_to_the_store(tmp_path):
+    store = openThumbStore(str(tmp_path), "files")
+    path = makeSource(tmp_path, "a.png")
+    assert not hasValidThumb(path, None, store)
+    store.put(path, b"jpeg")
+    assert hasValidThumb(path, None, store)
+
+
+def test_path_map_uses_longest_prefix_on_separator():
+    mapPath = PathMap(["/mnt/tex=T:/tex", "/mnt/tex/hero=H:/", "/mnt=M:"])
+    assert mapPath("/mnt/tex/wood.jpg") == "T:/tex/wood.jpg"
+    assert mapPath("/mnt/tex/hero/face.exr") == "H:/face.exr"
+    assert mapPath("/mnt/texture/a.jpg") == "M:/texture/a.jpg"
+    assert mapPath("/srv/a.jpg") == "/srv/a.jpg"
+    assert not PathMap([])
@@ -0,0 +1,58 @@
+'''
+Thumb store backends, run from the repository root with
+
+    python -m pytest tests
+'''
+import os, sys, multiprocessing
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts", "python"))
+
+from Houdini_Image_Browser.thumbstore import openThumbStore
+
+
+@pytest.mark.parametrize("backend", ["files", "packed"])
+def test_put_then_get(tmp_path, backend):
+    store = openThumbStore(str(tmp_path), backend)
+    assert store.get("/a/b.jpg") is None and not store.contains("/a/b.jpg")
+    store.put("/a/b.jpg", b"first")
+    store.put("/a/c.jpg", b"other")
+    assert store.get("/a/b.jpg") == b"first" and store.contains("/a/b.jpg")
+    store.put("/a/b.jpg", b"regenerated")  # later records override earlier ones
+    assert store.get("/a/b.jpg") == b"regenerated"
+    assert store.get("\\a\\c.jpg") == b"other"  # keys ignore the path separator
+    store.close()
+
+
+def test_packed_store_sees_other_writers(tmp_path):
+    writer = openThumbStore(str(tmp_path), "packed")
+    reader = openThumbStore(str(tmp_path), "packed")
+    reader.get("/x.jpg")  # loads the empty index first
+    writer.put("/x.jpg", b"late")
+    assert reader.get("/x.jpg") == b"late"
+
+
+def appendThumbs(root, prefix, count):
+    store = openThumbStore(root, "packed")
+    for i in range(count):
+        store.put("/shard/%s_%d.jpg" % (prefix, i), ("%s %d " % (prefix, i)).encode() * 50)
+    store.close()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_packed_appends_from_several_processes(tmp_path):
+    root = str(tmp_path)
+    count = 40
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=appendThumbs, args=(root, "p%d" % n, count)) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    store = openThumbStore(root, "packed")
+    for n in range(4):
+        for i in range(count):
+            assert store.get("/shard/p%d_%d.jpg" % (n, i)) == ("p%d %d " % (n, i)).encode() * 50